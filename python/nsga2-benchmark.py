@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+'''
+Benchmark NSGA-II on standard multi-objective problems, sweeping population sizes, worker counts,
+and objective counts, and writing one JSON line per run for regression tracking.  Each run has a
+fresh process of its own, so that its peak memory is measured apart from the others'.
+
+Example:
+
+    python3 nsga2-benchmark.py --problems ZDT1 DTLZ2 --pop-sizes 100 400 --workers 1 4 --output bench.jsonl
+
+Copyright (C) 2020 Simon D. Levy
+
+MIT License
+'''
+
+import sys
+import json
+import time
+import resource
+import argparse
+import platform
+import numpy as np
+import multiprocessing as mp
+
+from sueap.algorithms.nsga2 import NSGA2
+from sueap.benchmarks import PROBLEMS
+from sueap.indicators import hypervolume, igd, spread
+from sueap.instrumentation import CallbackSink
+
+class _Reporter:
+
+    def report(self, P, g, G):
+        self.P = P
+
+def _run(name, fsiz, pop_size, workers, ngen, seed):
+
+    problem = PROBLEMS[name]() if fsiz is None else PROBLEMS[name](fsiz)
+
+    # True front and reference point, computed before the run so they don't count against it
+    Z = problem.pareto_front()
+    fmin, fmax = np.array(problem.fmin), np.array(problem.fmax)
+    ref = fmax + 0.1 * (fmax - fmin)
+
+    records = []
+    reporter = _Reporter()
+    ga = NSGA2(problem, pop_size, workers_count=workers, sinks=[CallbackSink(records.append)], seed=seed)
+
+    t_start = time.time()
+    ga.run(ngen, reporter, show_progress=False)
+    wall = time.time() - t_start
+
+    P = reporter.P
+    F = P.f[P.rank == 1]
+
+    # Peak resident memory of this run's process and of its largest worker, which have all been joined
+    main_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    worker_rss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+
+    return {
+            'problem'         : name,
+            'fsiz'            : problem.fsiz,
+            'ndim'            : problem.ndim,
+            'pop_size'        : pop_size,
+            'workers'         : workers,
+            'generations'     : ngen,
+            'seed'            : seed,
+            'wall_time'       : wall,
+            'time_per_gen'    : float(np.mean([r['time'] for r in records])),
+            'evals_per_sec'   : float(np.mean([r['evals_per_sec'] for r in records])),
+            'phase_times'     : {phase : float(np.sum([r[phase] for r in records]))
+                                 for phase in ('evaluation', 'transfer', 'sorting', 'crowding', 'selection', 'variation', 'archive')},
+            'peak_rss_kb'     : main_rss + worker_rss,
+            'main_rss_kb'     : main_rss,
+            'worker_rss_kb'   : worker_rss,
+            'hypervolume'     : hypervolume(F, ref),
+            'igd'             : igd(F, Z),
+            'spread'          : spread(F, Z),
+            'python'          : platform.python_version(),
+            'numpy'           : np.__version__,
+            }
+
+def _run_child(conn, *args):
+
+    conn.send(_run(*args))
+    conn.close()
+
+def _run_process(*args):
+    '''
+    Runs _run() in a newly spawned process, returning its result
+    '''
+
+    ctx = mp.get_context('spawn')
+    parent, child = ctx.Pipe(duplex=False)
+    p = ctx.Process(target=_run_child, args=(child,) + args)
+    p.start()
+    child.close()
+
+    # The pipe closes without a result if the run dies
+    try:
+        result = parent.recv()
+    except EOFError:
+        result = None
+
+    p.join()
+
+    if result is None:
+        raise RuntimeError('Benchmark run %s failed with exit code %d' % (args[:4], p.exitcode))
+
+    return result
+
+def main():
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--problems', nargs='+', default=['ZDT1', 'ZDT2', 'ZDT3', 'ZDT4', 'ZDT6', 'DTLZ2', 'FON', 'POL'],
+            choices=sorted(PROBLEMS), help='problems to run')
+    parser.add_argument('--pop-sizes', nargs='+', type=int, default=[100], help='population sizes')
+    parser.add_argument('--workers', nargs='+', type=int, default=[1], help='worker counts')
+    parser.add_argument('--objectives', nargs='+', type=int, default=[3], help='objective counts for DTLZ problems')
+    parser.add_argument('--generations', type=int, default=100, help='number of generations')
+    parser.add_argument('--seed', type=int, default=0, help='random seed')
+    parser.add_argument('--output', default=None, help='JSONL file to append results to (default stdout)')
+    args = parser.parse_args()
+
+    out = open(args.output, 'a') if args.output is not None else sys.stdout
+
+    for name in args.problems:
+        for fsiz in (args.objectives if name.startswith('DTLZ') else [None]):
+            for pop_size in args.pop_sizes:
+                for workers in args.workers:
+                    result = _run_process(name, fsiz, pop_size, workers, args.generations, args.seed)
+                    out.write(json.dumps(result) + '\n')
+                    out.flush()
+
+if __name__ == '__main__':
+
+    main()
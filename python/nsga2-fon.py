@@ -16,21 +16,31 @@ class Fon:
     PM   = .01
     PC   = .7
 
+    def __init__(self):
+        self.rng = np.random.default_rng()
+
     def new_params(self):
-        return 8 * np.random.random(3) - 4
+        return 8 * self.rng.random(3) - 4
 
     def eval_params(self, x):
         fitness = np.array((1 - np.exp(-np.sum((x-1/np.sqrt(3))**2)), (1 - np.exp(-np.sum((x+1/np.sqrt(3))**2)))))
         steps   = 1 
         return fitness, steps
 
+    def eval_batch(self, X):
+        fitness = np.column_stack((1 - np.exp(-np.sum((X-1/np.sqrt(3))**2, axis=1)), (1 - np.exp(-np.sum((X+1/np.sqrt(3))**2, axis=1)))))
+        steps   = np.ones(len(X), dtype=int)
+        return fitness, steps
+
     @staticmethod
     def fitcmp(f1, f2):
         return f1 < f2
 
-    @staticmethod
-    def mutate(x, g, G):
-        return x + np.random.randn(3) * Fon.PM * (G-g)/G
+    def mutate(self, x, g, G):
+        return x + self.rng.standard_normal(3) * Fon.PM * (G-g)/G
+
+    def mutate_batch(self, X, g, G):
+        return X + self.rng.standard_normal(X.shape) * Fon.PM * (G-g)/G
 
     @property
     def fmin(self):
@@ -48,11 +58,15 @@ class Fon:
     def pc(self):
         return self.PC
 
-    @staticmethod
-    def crossover(p, q):
+    def crossover(self, p, q):
+
+        k = self.rng.integers(3-1) + 1
+        return np.append(p[:k], q[k:])
+
+    def crossover_batch(self, P, Q):
 
-        k = np.random.randint(3-1) + 1
-        return np.append(p.x[:k], q.x[k:])
+        k = self.rng.integers(1, 3, len(P))
+        return np.where(np.arange(3) < k[:,np.newaxis], P, Q)
 
 if __name__ == '__main__':
 
@@ -15,7 +15,10 @@ setup (name = 'sueap',
     version = '0.1',
     install_requires = ['numpy'],
     description = 'Suite of Evolutionary Algorithms in Parallel',
-    packages = ['sueap', 'sueap.algorithms', 'sueap.algorithms.nsga2', 'sueap.algorithms.elitist', 'sueap.gym'],
+    packages = ['sueap', 'sueap.algorithms', 'sueap.algorithms.nsga2', 'sueap.algorithms.elitist',
+        'sueap.algorithms.islands', 'sueap.gym', 'sueap.instrumentation', 'sueap.benchmarks', 'sueap.indicators',
+        'sueap.cluster', 'sueap.runlog', 'sueap.surrogate'],
+    entry_points = {'console_scripts': ['sueap-worker = sueap.cluster:worker_main']},
     author='Simon D. Levy',
     author_email='simon.d.levy@gmail.com',
     url='https://github.com/simondlevy/sueap',
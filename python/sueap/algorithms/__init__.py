@@ -1,137 +1,1140 @@
 '''
 __init__.py for SUEAP algorithms
 
-Contains GA superclass for distributed fitness evaluation.
+Contains GA superclass and a reusable pool of workers for distributed fitness evaluation.
 
 Copyright (C) 2020 Simon D. Levy
 
 MIT License
 '''
 
+import os
+import json
 import time
+import hashlib
+import queue
+import threading
+import contextlib
 import collections
 import multiprocessing as mp
+from multiprocessing import shared_memory, resource_tracker
+import numpy as np
+from sueap.instrumentation import Instruments
 
-# Workers use named tuple to send results back to main
-_WorkerToMainItem = collections.namedtuple('_WorkerToMainItem', field_names=['params', 'fitness', 'steps'])
+# Workers use named tuple to send results back to main, one per batch of evaluated params.  With shared-memory
+# transport, params, fitness and steps are left as None, since the results are already in shared memory.  Offset
+# is the position of the first of the params in the population being evaluated.
+_WorkerToMainItem = collections.namedtuple('_WorkerToMainItem',
+        field_names=['count', 'params', 'fitness', 'steps', 'worker_id', 'busy', 'task_id', 'offset'],
+        defaults=[None, None, None, None, 0., None, None])
+
+# Main sends workers chunks of params to evaluate, along with an optional racing threshold, the position of the
+# chunk in the population, and an optional seed (entropy, spawn_key, first) for the members' random streams
+_QueueTask = collections.namedtuple('_QueueTask', field_names=['params', 'threshold', 'task_id', 'offset', 'seed'],
+        defaults=[None, 0, None])
+
+# With shared-memory transport, main sends workers the shared arrays' descriptions and a range of rows to evaluate
+_SharedMemoryTask = collections.namedtuple('_SharedMemoryTask',
+        field_names=['params', 'fitness', 'steps', 'start', 'stop', 'threshold', 'task_id', 'seed'],
+        defaults=[None, None])
+
+# Workers tell main which task they've taken before starting on it, so main knows what a lost worker was doing.
+# The pid tells a claim from a replaced worker apart from one from its replacement.
+_Claim = collections.namedtuple('_Claim', field_names=['worker_id', 'task_id', 'pid'])
+
+# Seconds main waits for a result before checking on the workers
+_POLL_INTERVAL = 0.5
+
+class _ResultQueue:
+    '''
+    A queue from the workers to main.  Unlike multiprocessing.Queue, put() writes straight to a pipe
+    instead of a buffer, so nothing a worker has sent is lost if the worker dies.
+    '''
+
+    def __init__(self):
+
+        self.reader, self.writer = mp.Pipe(duplex=False)
+        self.lock = mp.Lock()
+
+    def put(self, obj):
+
+        with self.lock:
+            self.writer.send(obj)
+
+    def get(self, timeout=None):
+
+        if not self.reader.poll(timeout):
+            raise queue.Empty
+        return self.reader.recv()
+
+class _Pending:
+    '''
+    A task that has been sent out and not yet fully returned
+    '''
+
+    def __init__(self, task, failures):
+
+        self.task = task
+        self.failures = failures     # number of times the task has been lost
+        self.delivered = 0           # number of members whose results have come back
+
+    @property
+    def size(self):
+
+        return len(self.task.params) if isinstance(self.task, _QueueTask) else self.task.stop - self.task.start
+
+    def remainder(self):
+        '''
+        Returns the members still to be evaluated, as a list of one-member tasks
+        '''
+
+        task = self.task
+
+        if isinstance(task, _QueueTask):
+            return [task._replace(params=[params], offset=task.offset+self.delivered+k)
+                    for k, params in enumerate(task.params[self.delivered:])]
+
+        return [task._replace(start=row, stop=row+1) for row in range(task.start+self.delivered, task.stop)]
+
+class _SharedArray:
+    '''
+    A NumPy array backed by a named shared-memory block
+    '''
+
+    def __init__(self, shape, dtype, name=None):
+
+        size = max(1, int(np.prod(shape)) * np.dtype(dtype).itemsize)
+        self.shm = shared_memory.SharedMemory(name=name, create=(name is None), size=size)
+        self.array = np.ndarray(shape, dtype=dtype, buffer=self.shm.buf)
+
+    @staticmethod
+    def attach(desc):
+
+        name, shape, dtype = desc
+        return _SharedArray(shape, dtype, name)
+
+    @property
+    def desc(self):
+
+        return self.shm.name, self.array.shape, self.array.dtype.str
+
+    def close(self, unlink=False):
+
+        del self.array # release our view so the buffer can be closed
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
+
+class _FitnessCache:
+    '''
+    A bounded least-recently-used map from parameter arrays to their fitnesses
+    '''
+
+    def __init__(self, maxsize):
+
+        self.maxsize = maxsize
+        self.entries = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+
+        return len(self.entries)
+
+    @staticmethod
+    def key(params):
+
+        params = np.ascontiguousarray(params)
+        digest = hashlib.blake2b(params.tobytes(), digest_size=16).digest()
+        return digest, params.shape, params.dtype.str
+
+    def get(self, key):
+        '''
+        Returns the cached fitness for key, or None if there isn't one
+        '''
+
+        if key not in self.entries:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return self.entries[key]
+
+    def put(self, key, fitness):
+
+        self.entries[key] = fitness
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def save(self):
+        '''
+        Returns the cache's keys as JSON-compatible lists and its fitnesses as an array, oldest first
+        '''
+
+        keys = [[digest.hex(), list(shape), dtype] for digest, shape, dtype in self.entries]
+        return keys, np.array(list(self.entries.values()))
+
+    def load(self, keys, fitnesses):
+
+        self.entries.clear()
+        for (digest, shape, dtype), fitness in zip(keys, fitnesses):
+            self.put((bytes.fromhex(digest), tuple(shape), dtype), fitness)
+
+class _Checkpointer:
+    '''
+    Writes checkpoint files on a background thread, one at a time.  Each file is written under a
+    temporary name and then renamed, so a crash never leaves a partial checkpoint behind.
+    '''
+
+    def __init__(self):
+
+        self.thread = None
+
+    def write(self, path, arrays):
+
+        self.wait()
+        self.thread = threading.Thread(target=self._write, args=(path, arrays))
+        self.thread.start()
+
+    def wait(self):
+
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    @staticmethod
+    def _write(path, arrays):
+
+        tmp = path + '.tmp'
+        with open(tmp, 'wb') as f:
+            np.savez(f, **arrays)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+
+class EvaluationPool:
+    '''
+    A pool of worker processes for evaluating fitnesses, which can be kept alive across runs and
+    shared by several GA instances:
+
+        with EvaluationPool(problem, workers_count=8) as pool:
+            for noise_std in (0.01, 0.02):
+                Elitist(problem, 256, noise_std, pool=pool).run(100)
+    '''
+
+    def __init__(self, problem, workers_count=None, shared_memory=False, chunk_size=None, timeout=None, retries=2,
+            penalty=None, seed=None):
+        '''
+        Inputs:
+            problem       an object providing an eval_params() method, and optionally an eval_batch()
+                          method taking a matrix of params and returning a matrix of fitnesses and a
+                          vector of steps; workers always evaluate with this object, and call its
+                          close() method, if any, when they stop
+            workers_count number of worker processes; default None uses all available CPUs, and 0
+                          evaluates in the calling process instead
+            shared_memory pass params and fitnesses between main and workers through shared memory
+                          instead of pickling them through queues; requires params of equal shape,
+                          and a problem.fsiz attribute if fitnesses are vectors
+            chunk_size    number of population members handed to a worker at a time; default None
+                          hands out chunks that shrink as the remaining work runs out
+            timeout       optional number of seconds an evaluation may take (for problem.eval_batch(),
+                          per member of the batch), after which its worker is killed and replaced
+            retries       number of times a member whose evaluation crashed or timed out its worker is
+                          tried again; members of a lost chunk are first retried one at a time, so that
+                          only the member responsible is penalized
+            penalty       fitness given to a member that has used up its retries; default None raises
+                          a RuntimeError instead
+            seed          optional int or np.random.SeedSequence from which each worker's problem.rng is
+                          spawned, so that workers don't share the random state they were forked with
+        '''
+
+        self.problem = problem
+        self.workers_count = mp.cpu_count() if workers_count is None else workers_count
+        self.shared_memory = shared_memory
+        self.chunk_size = chunk_size
+        self.timeout = timeout
+        self.retries = retries
+        self.penalty = penalty
+
+        # Each worker, including any replacement for a lost one, gets its own child of this
+        self.seed_sequence = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+
+        # Workers will be set up by start()
+        self.main_to_worker_queue = None
+        self.worker_to_main_queue = None
+        self.workers = None
+
+        # Shared-memory arrays for params, fitnesses, and steps will be allocated as needed
+        self.shared_arrays = {}
+
+        # Without workers, the calling process does the evaluating, and is counted as the only worker
+        self.inline = self.workers_count == 0
+        self.inline_attached = {}
+
+        # Per-worker time spent evaluating and number of evaluations, and total time spent in evaluate()
+        self.worker_busy = np.zeros(max(1, self.workers_count))
+        self.worker_evals = np.zeros(max(1, self.workers_count), dtype=int)
+        self.eval_time = 0
+
+        # Time spent sending work to the workers
+        self.dispatch_time = 0
+
+        # Values returned by each worker's problem.close(), if the problem has one, when the pool stops
+        self.worker_reports = [None] * max(1, self.workers_count)
+
+        # Tasks sent out and not yet returned, by id, and the task each worker is working on, with the
+        # time of its last result
+        self.pending = {}
+        self.claims = {}
+        self.next_task_id = 0
+
+        # Time workers were last checked for having died or taken too long
+        self.last_check = 0
+
+        # Results made up by main for members that have used up their retries
+        self.penalized = collections.deque()
+
+        # Numbers of workers replaced, of those killed for taking too long, and of members penalized
+        self.respawned = 0
+        self.timeouts = 0
+        self.failures = 0
+
+    def __enter__(self):
+
+        return self.start()
+
+    def __exit__(self, *_):
+
+        self.stop()
+
+    @property
+    def running(self):
+
+        return self.workers is not None
+
+    def start(self):
+        '''
+        Starts the worker processes.
+        Returns: this pool
+        '''
+
+        # Workers must share main's resource tracker, or theirs would unlink shared memory when they exit
+        if self.shared_memory:
+            resource_tracker.ensure_running()
+
+        self.workers = []
+
+        # Inline results go straight into a local queue
+        if self.inline:
+            self.worker_to_main_queue = queue.SimpleQueue()
+            return self
+
+        # Workers pull chunks of work from a single queue, so faster workers take more of them
+        self.main_to_worker_queue = mp.Queue()
+        self.worker_to_main_queue = _ResultQueue()
+        self.workers = [self._start_worker(k) for k in range(self.workers_count)]
+
+        return self
+
+    def _start_worker(self, worker_id):
+
+        w = mp.Process(target=self._worker_func, args=(worker_id, self.seed_sequence.spawn(1)[0]))
+        w.start()
+
+        return w
+
+    def stop(self):
+        '''
+        Tells each worker to stop, waits for them to exit, and releases any shared memory.
+        '''
+
+        if not self.running:
+            return
+
+        for _ in self.workers:
+            self.main_to_worker_queue.put([]) # workers stop on []
+
+        # Each worker sends back whatever its problem's close() method returned, unless it has died
+        remaining = set(range(len(self.workers)))
+        while len(remaining) > 0:
+            try:
+                message = self.worker_to_main_queue.get(timeout=_POLL_INTERVAL)
+            except queue.Empty:
+                remaining = {k for k in remaining if self.workers[k].is_alive()}
+                continue
+            if not isinstance(message, (_Claim, _WorkerToMainItem)):
+                worker_id, report = message
+                self.worker_reports[worker_id] = report
+                remaining.discard(worker_id)
+
+        for w in self.workers:
+            w.join()
+        self.workers = None
+
+        self.pending.clear()
+        self.claims.clear()
+
+        if self.inline:
+            self.worker_reports[0] = self._close_worker(self.inline_attached)
+
+        for shared in self.shared_arrays.values():
+            shared.close(unlink=True)
+        self.shared_arrays = {}
+
+    def evaluate(self, params, progress=None, threshold=None, seed=None):
+        '''
+        Computes fitnesses on the workers.
+        Inputs:
+            params    list of arrays of parameters from each population member
+            progress  optional function called as progress(ndone, total) as results arrive
+            threshold optional fitness that a member must be able to reach to be worth evaluating fully;
+                      when given, workers call problem.eval_race(params, threshold) if the problem has it
+            seed      optional np.random.SeedSequence; when given, problem.rng is set for each member's
+                      evaluation to a generator for the stream that seed.spawn() would give that member,
+                      so that stochastic fitnesses don't depend on which worker computed them.  A call to
+                      problem.eval_batch() gets the stream of the first member in its batch.
+        Returns: 
+            a list of pairs of the form (params,fitness), one for each population member, in order
+            a count of the number of evaluation steps taken to compute the fitness
+        '''
+
+        t_start = time.time()
+
+        if seed is not None:
+            seed = (seed.entropy, seed.spawn_key, seed.n_children_spawned)
+
+        # With shared memory, write the generation's params once and send workers only ranges of rows
+        if self.shared_memory:
+            X = np.asarray(params)
+            shared = self._share_params(X)
+            descs = {key : shared[key].desc for key in shared}
+            make_task = lambda start, stop: _SharedMemoryTask(start=start, stop=stop, threshold=threshold,
+                    seed=seed, **descs)
+        else:
+            make_task = lambda start, stop: _QueueTask(params[start:stop], threshold, offset=start, seed=seed)
+
+        # Queue up all the work in chunks
+        for start, stop in self._chunks(len(params)):
+            self._put_task(make_task(start, stop))
+
+        self.dispatch_time += time.time() - t_start
+
+        population = [None] * len(params)
+        steps = 0
+        ndone = 0
+
+        # Get back population fitnesses and number of steps taken to compute, putting them in the order sent
+        while ndone < len(params):
+            item = self._get_item()
+            ndone += item.count
+            if item.params is not None:
+                population[item.offset:item.offset+item.count] = zip(item.params, item.fitness)
+                steps += sum(item.steps)
+            if progress is not None:
+                progress(ndone, len(params))
+
+        if self.shared_memory:
+            population = list(zip(X, shared['fitness'].array.copy()))
+            steps = int(np.sum(shared['steps'].array))
+
+        self.eval_time += time.time() - t_start
+
+        return population, steps
+
+    def submit(self, params, threshold=None, seed=None):
+        '''
+        Queues a single population member for evaluation, without waiting for the result.  Always uses
+        queue transport.
+        Inputs:
+            params    array of parameters
+            threshold optional racing threshold, as for evaluate()
+            seed      optional np.random.SeedSequence, as for evaluate()
+        '''
+
+        self._put_task(_QueueTask([params], threshold,
+            seed=None if seed is None else (seed.entropy, seed.spawn_key, seed.n_children_spawned)))
+
+    def _put_task(self, task, failures=0):
+
+        task = task._replace(task_id=self.next_task_id)
+        self.next_task_id += 1
+        self.pending[task.task_id] = _Pending(task, failures)
+
+        if not self.inline:
+            self.main_to_worker_queue.put(task)
+            return
+
+        for item in self._task_items(self.inline_attached, task, 0):
+            self.worker_to_main_queue.put(item)
+
+    def receive(self):
+        '''
+        Waits for the next result from a submit(), in order of completion.
+        Returns: params, fitness, steps
+        '''
+
+        item = self._get_item()
+
+        return item.params[0], item.fitness[0], item.steps[0]
+
+    def _get_item(self):
+
+        while True:
+
+            if len(self.penalized) > 0:
+                return self.penalized.popleft()
+
+            # Check on a clock, so that a steady flow of results from other workers can't hide a lost one
+            if time.time() - self.last_check >= _POLL_INTERVAL:
+                self._check_workers()
+                self.last_check = time.time()
+
+            try:
+                item = self.worker_to_main_queue.get(timeout=_POLL_INTERVAL)
+            except queue.Empty:
+                continue
+
+            if isinstance(item, _Claim):
+                self._claim(item)
+                continue
+
+            # A lost task's results may turn up after the task has been sent out again
+            pending = self.pending.get(item.task_id)
+            if pending is None:
+                continue
+
+            pending.delivered += item.count
+            if pending.delivered >= pending.size:
+                del self.pending[item.task_id]
+            if self.claims.get(item.worker_id, (None,))[0] == item.task_id:
+                self.claims[item.worker_id] = (item.task_id, time.time())
+
+            self.worker_busy[item.worker_id] += item.busy
+            self.worker_evals[item.worker_id] += item.count
+
+            return item
+
+    def _claim(self, claim):
+
+        # A worker checked on while its claim was still in the pipe has been replaced without main knowing
+        # what it was doing, so its task is sent out again now
+        if self.workers and self.workers[claim.worker_id].pid != claim.pid:
+            if claim.task_id in self.pending:
+                self._redispatch(self.pending.pop(claim.task_id), claim.worker_id)
+            return
+
+        self.claims[claim.worker_id] = (claim.task_id, time.time())
+
+    def _check_workers(self):
+        '''
+        Replaces workers that have died or are taking too long, sending their unfinished work out again
+        '''
+
+        if not self.workers:
+            return
+
+        for k, w in enumerate(self.workers):
+
+            if k in self.claims and self.timeout is not None and w.is_alive():
+                task_id, t_last = self.claims[k]
+                pending = self.pending.get(task_id)
+                if pending is not None and time.time() - t_last > self.timeout * self._batch_size(pending):
+                    w.kill()
+                    w.join()
+                    self.timeouts += 1
+
+            if not w.is_alive():
+                w.join()
+                self.workers[k] = self._start_worker(k)
+                self.respawned += 1
+                task_id, _ = self.claims.pop(k, (None, None))
+                if task_id in self.pending:
+                    self._redispatch(self.pending.pop(task_id), k)
+
+    def _batch_size(self, pending):
+
+        # Number of members evaluated by the worker's next call to the problem; as in _eval_batches(),
+        # eval_batch() takes the whole chunk unless it is raced with eval_race()
+        racing = pending.task.threshold is not None and hasattr(self.problem, 'eval_race')
+        whole = hasattr(self.problem, 'eval_batch') and not racing
+        return pending.size - pending.delivered if whole else 1
+
+    def _redispatch(self, pending, worker_id):
+
+        remainder = pending.remainder()
+
+        # Retry the members of a lost chunk separately, to find the one responsible
+        if len(remainder) > 1:
+            for task in remainder:
+                self._put_task(task)
+            return
+
+        if len(remainder) == 0:
+            return
+
+        task, = remainder
+
+        if pending.failures < self.retries:
+            self._put_task(task, pending.failures+1)
+            return
+
+        if self.penalty is None:
+            self._terminate()
+            raise RuntimeError('Evaluation failed %d times' % (pending.failures+1))
+
+        self.failures += 1
+
+        if isinstance(task, _SharedMemoryTask):
+            self.shared_arrays['fitness'].array[task.start] = self.penalty
+            self.shared_arrays['steps'].array[task.start] = 0
+            self.penalized.append(_WorkerToMainItem(count=1, worker_id=worker_id, offset=task.start))
+        else:
+            self.penalized.append(_WorkerToMainItem(count=1, params=task.params, fitness=[self.penalty], steps=[0],
+                worker_id=worker_id, offset=task.offset))
+
+    def _terminate(self):
+        '''
+        Kills the workers without waiting for them to finish, and releases any shared memory
+        '''
+
+        for w in self.workers:
+            w.kill()
+            w.join()
+        self.workers = None
+
+        for shared in self.shared_arrays.values():
+            shared.close(unlink=True)
+        self.shared_arrays = {}
+
+    @property
+    def worker_utilization(self):
+        '''
+        Fraction of the time spent in evaluate() that each worker has spent evaluating
+        '''
+
+        return self.worker_busy / self.eval_time if self.eval_time > 0 else np.zeros(len(self.worker_busy))
+
+    def _chunks(self, n):
+        '''
+        Yields (start,stop) index ranges covering n population members.  Without a fixed chunk size,
+        each chunk gets half of an equal share of the remaining work (guided self-scheduling), so
+        early chunks are big and the last few are small enough to even out the workers' finishing times.
+        '''
+
+        start = 0
+        while start < n:
+            size = self.chunk_size if self.chunk_size is not None else -(-(n-start) // (2*max(1, self.workers_count)))
+            yield start, min(n, start+size)
+            start += size
+
+    def _share_params(self, X):
+
+        fsiz = getattr(self.problem, 'fsiz', None)
+        shared = {'params'  : self._shared_array('params', X.shape, X.dtype),
+                  'fitness' : self._shared_array('fitness', (len(X),) if fsiz is None else (len(X),fsiz), float),
+                  'steps'   : self._shared_array('steps', (len(X),), int)}
+        shared['params'].array[:] = X
+
+        return shared
+
+    def _shared_array(self, key, shape, dtype):
+
+        # Re-use the previous generation's block when possible
+        old = self.shared_arrays.get(key)
+        if old is not None:
+            if old.array.shape == tuple(shape) and old.array.dtype == np.dtype(dtype):
+                return old
+            old.close(unlink=True)
+
+        self.shared_arrays[key] = _SharedArray(shape, dtype)
+
+        return self.shared_arrays[key]
+
+    def _eval_shared(self, shared, start, stop, threshold=None, seed=None):
+        '''
+        Evaluates rows start through stop-1 of the shared params, writing the results into the shared
+        fitness and steps arrays and yielding a _WorkerToMainItem with the number of rows done as it goes.
+        '''
+
+        row = start
+        for item in self._eval_batches(shared['params'].array[start:stop], threshold, seed):
+            n = item.count
+            shared['fitness'].array[row:row+n] = item.fitness
+            shared['steps'].array[row:row+n] = item.steps
+            row += n
+            yield _WorkerToMainItem(count=n)
+
+    def _worker_func(self, worker_id, seed_sequence):
+
+        # Don't share the random state inherited from main with the other workers
+        self.problem.rng = np.random.default_rng(seed_sequence)
+
+        # Shared-memory arrays this worker has attached to
+        attached = {}
+
+        # Loop until halted, getting chunks of params, evaluating their fitnesses, and sending them back to main
+        while True:
+            task = self.main_to_worker_queue.get()
+            if len(task) == 0: # main sends [] when done
+                break
+            self.worker_to_main_queue.put(_Claim(worker_id, task.task_id, os.getpid()))
+            for item in self._task_items(attached, task, worker_id):
+                self.worker_to_main_queue.put(item)
+
+        # Tell main we're done
+        self.worker_to_main_queue.put((worker_id, self._close_worker(attached)))
+
+    def _task_items(self, attached, task, worker_id):
+        '''
+        Evaluates a task, yielding _WorkerToMainItems stamped with the worker's id, busy time, and position
+        in the population
+        '''
+
+        if isinstance(task, _SharedMemoryTask):
+            self._attach_shared(attached, task)
+            offset = task.start
+            items = self._eval_shared(attached, task.start, task.stop, task.threshold, self._task_seed(task, offset))
+        else:
+            offset = task.offset
+            items = self._eval_batches(task.params, task.threshold, self._task_seed(task, offset))
+
+        t_start = time.time()
+        for item in items:
+            yield item._replace(worker_id=worker_id, busy=time.time()-t_start, task_id=task.task_id, offset=offset)
+            offset += item.count
+            t_start = time.time()
+
+    @staticmethod
+    def _task_seed(task, offset):
+
+        # Seed for the streams of the task's members, which come offset streams after the population's first
+        if task.seed is None:
+            return None
+        entropy, spawn_key, first = task.seed
+        return entropy, spawn_key, first+offset
+
+    def _close_worker(self, attached):
+
+        for shared in attached.values():
+            shared.close()
+        attached.clear()
+
+        # Let the problem release per-process resources
+        return self.problem.close() if hasattr(self.problem, 'close') else None
+
+    @staticmethod
+    def _attach_shared(attached, task):
+
+        # Attach to any arrays that main has (re)allocated since the previous task
+        for key in ('params', 'fitness', 'steps'):
+            desc = getattr(task, key)
+            if key not in attached or attached[key].desc != desc:
+                if key in attached:
+                    attached[key].close()
+                attached[key] = _SharedArray.attach(desc)
+
+    def _eval_batches(self, allparams, threshold=None, seed=None):
+        '''
+        Evaluates a list of params, yielding results as _WorkerToMainItems.  Uses a single call to
+        problem.eval_batch() when the problem provides it, and otherwise yields one item per
+        call to problem.eval_params(), or to problem.eval_race() when racing against a threshold.
+        With a seed (entropy, spawn_key, first), the k-th call gets the stream of member first+k.
+        '''
+
+        if len(allparams) == 0:
+            return
+
+        if threshold is not None and hasattr(self.problem, 'eval_race'):
+            for k, params in enumerate(allparams):
+                with self._member_rng(seed, k):
+                    fitness, steps = self.problem.eval_race(params, threshold)
+                yield _WorkerToMainItem(count=1, params=[params], fitness=[fitness], steps=[steps])
+            return
+
+        if hasattr(self.problem, 'eval_batch'):
+            with self._member_rng(seed, 0):
+                fitness, steps = self.problem.eval_batch(np.array(allparams))
+            yield _WorkerToMainItem(count=len(allparams), params=allparams, fitness=list(fitness), steps=list(steps))
+            return
+
+        for k, params in enumerate(allparams):
+            with self._member_rng(seed, k):
+                fitness, steps = self.problem.eval_params(params)
+            yield _WorkerToMainItem(count=1, params=[params], fitness=[fitness], steps=[steps])
+
+    @contextlib.contextmanager
+    def _member_rng(self, seed, k):
+        '''
+        Sets problem.rng to the k-th member's stream for the duration of the block, putting back the
+        problem's own generator afterward (which matters when evaluating in main)
+        '''
+
+        if seed is None:
+            yield
+            return
+
+        entropy, spawn_key, first = seed
+        saved = getattr(self.problem, 'rng', None)
+        self.problem.rng = np.random.default_rng(np.random.SeedSequence(entropy, spawn_key=spawn_key+(first+k,)))
+        try:
+            yield
+        finally:
+            self.problem.rng = saved
 
 class GA:
     '''
     GA superclass for distributed fitness evaluation.
     '''
 
-    def __init__(self, problem, pop_size):
+    def __init__(self, problem, pop_size, pool=None, workers_count=None, shared_memory=False, chunk_size=None,
+            timeout=None, retries=2, penalty=None, cache_size=0, checkpoint=None, checkpoint_every=10, sinks=None,
+            seed=None, log=None, surrogate=None, screen_fraction=0.5):
         '''
         Inputs:
-            problem  an object providing new_params() and eval_params() methods
-            pop_size population size
+            problem       an object providing new_params() and eval_params() methods, and drawing any
+                          random numbers it needs from its rng attribute, which is set by the GA
+            pop_size      population size
+            pool          optional running EvaluationPool to use (and leave running) instead of
+                          starting workers for each run
+            workers_count number of workers when not using a pool; default None uses all available CPUs
+            shared_memory passed to EvaluationPool when not using a pool
+            chunk_size    passed to EvaluationPool when not using a pool
+            timeout       passed to EvaluationPool when not using a pool
+            retries       passed to EvaluationPool when not using a pool
+            penalty       passed to EvaluationPool when not using a pool
+            cache_size    if positive, remember the fitnesses of up to this many recently evaluated params and
+                          skip re-evaluating them; use only with deterministic problems
+            checkpoint    optional name of a .npz file in which to save the complete state of the run, from
+                          which run(..., resume=True) can continue
+            checkpoint_every number of generations between checkpoints
+            sinks         optional list of sinks from sueap.instrumentation to receive per-generation timings
+            seed          optional int or np.random.SeedSequence; runs with the same seed give the same
+                          results whatever the number of workers
+            log           optional sueap.runlog.RunLog to which each generation's fitnesses, ranks, params
+                          and time are written
+            surrogate     optional model from sueap.surrogate, trained on every individual evaluated, for
+                          predicting the fitnesses of new individuals so that only the most promising
+                          are evaluated
+            screen_fraction fraction of each generation's new individuals that the surrogate lets through
         '''
  
         self.problem = problem
         self.pop_size = pop_size
 
-        # Use all available CPUs, distributing the population equally among them
-        self.workers_count = mp.cpu_count()
+        # Main's generator for selection and variation, the root of the evaluated members' streams, and
+        # the root of the workers' own streams
+        seed_sequence = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+        main, evaluations, workers = seed_sequence.spawn(3)
+        self.rng = np.random.default_rng(main)
+        self.evaluation_seed = evaluations.entropy, evaluations.spawn_key
+        self.evaluations = 0 # number of populations and individuals sent for evaluation so far
 
-        # Workers will be set up at start of run
-        self.main_to_worker_queues = None
-        self.worker_to_main_queue = None
-        self.workers = None
+        # Optional fitness cache, with hit and miss counters
+        self.cache = _FitnessCache(cache_size) if cache_size > 0 else None
+
+        # Without a shared pool, workers will be set up at start of run and shut down at the end
+        self.pool = pool
+        self.own_pool = pool is None
+        self.pool_options = {'workers_count':workers_count, 'shared_memory':shared_memory, 'chunk_size':chunk_size,
+                'timeout':timeout, 'retries':retries, 'penalty':penalty, 'seed':workers}
+        self.workers_count = pool.workers_count if pool is not None else (
+                mp.cpu_count() if workers_count is None else workers_count)
+
+        # Optional periodic checkpoints
+        self.checkpoint = checkpoint
+        self.checkpoint_every = checkpoint_every
+        self.checkpointer = _Checkpointer()
+
+        # Optional per-generation instrumentation
+        self.instruments = None
+        if sinks is not None:
+            self.instruments = Instruments(sinks)
+
+        # Optional surrogate model, with the number of evaluations it has saved, and the sum and number
+        # of its absolute errors in predicting the fitnesses of individuals before they were evaluated
+        self.surrogate = surrogate
+        self.screen_fraction = screen_fraction
+        self.evaluations_saved = 0
+        self.surrogate_errors = 0.
+        self.surrogate_predictions = 0
+
+        # Optional log of each generation's population, which is written when the generation ends
+        self.log = log
+        self.logged = None
+        self.generation = None
+        self.generation_start = None
 
         # Support for progress bar
         self.prev_progress = None
 
-    def start_workers(self, ngen):
+    def timer(self, phase):
         '''
-        Starts the workers for evaluating sub-population fitnesses.
+        Returns a context manager that adds the time spent in its block to the current generation's
+        timing for phase, if instrumentation is enabled
+        '''
+
+        return self.instruments.timer(phase) if self.instruments is not None else contextlib.nullcontext()
+
+    def begin_generation(self, generation):
+
+        self.generation = generation
+        self.generation_start = time.time()
+
+        if self.instruments is not None:
+            self.instruments.begin_generation(generation)
+
+    def end_generation(self, **extra):
+
+        if self.logged is not None:
+            params, fitness, rank = self.logged
+            self.log.record(self.generation, fitness, rank, params, time.time() - self.generation_start)
+            self.logged = None
+
+        if self.surrogate is not None:
+            extra.update(evaluations_saved=self.evaluations_saved, surrogate_error=self.surrogate_error)
+
+        if self.instruments is not None:
+            self.instruments.end_generation(**extra)
+
+    def log_population(self, params, fitness, rank=None):
+        '''
+        Sets the current generation's population to be written to the log, if there is one, when the
+        generation ends.
         Inputs:
-            ngen number of generations to run
+            params   list or matrix of the population's params
+            fitness  the population's fitnesses
+            rank     optional ranks (1 best); by default, the population is taken to be sorted best first
         '''
- 
-        self.main_to_worker_queues = []
-        self.worker_to_main_queue = mp.Queue(self.workers_count)
-        self.workers = []
-        for k in range(self.workers_count):
-            main_to_worker_queue = mp.Queue()
-            self.main_to_worker_queues.append(main_to_worker_queue)
-            w = mp.Process(target=self._worker_func, args=(ngen, k, main_to_worker_queue))
-            self.workers.append(w)
-            w.start()
 
-    def compute_fitness(self, params, show_progress=True):
+        if self.log is not None:
+            self.logged = params, fitness, rank
+
+    def save_checkpoint(self, generation, **arrays):
+        '''
+        Saves the state of a run in the background, if checkpointing is enabled and it's time for it.
+        Inputs:
+            generation index of the next generation to run
+            arrays     arrays describing the algorithm's state, as expected by its run() method
+        '''
+
+        if self.checkpoint is None or generation % self.checkpoint_every != 0:
+            return
+
+        # Problems may still draw from the global random state, so save that too
+        state = np.random.get_state(legacy=False)
+        state['state']['key'] = state['state']['key'].tolist()
+        meta = {'generation':generation, 'rng':state, 'generator':self.rng.bit_generator.state,
+                'evaluation_seed':self.evaluation_seed, 'evaluations':self.evaluations}
+
+        arrays = {key : np.array(value) for key, value in arrays.items()} # copy before handing off
+
+        if self.cache is not None:
+            meta['cache'], arrays['cache_fitness'] = self.cache.save()
+
+        arrays['meta'] = np.array(json.dumps(meta))
+
+        self.checkpointer.write(self.checkpoint, arrays)
+
+    def load_checkpoint(self):
+        '''
+        Restores the random-number generators and fitness cache from the checkpoint file.
+        Returns: index of the next generation to run, and a dictionary of the arrays saved by
+                 save_checkpoint(), or (0, None) if there is no checkpoint
+        '''
+
+        self.checkpointer.wait()
+
+        if self.checkpoint is None or not os.path.exists(self.checkpoint):
+            return 0, None
+
+        with np.load(self.checkpoint) as data:
+            arrays = {key : data[key] for key in data.files}
+
+        meta = json.loads(str(arrays.pop('meta')))
+
+        state = meta['rng']
+        state['state']['key'] = np.array(state['state']['key'], dtype=np.uint32)
+        np.random.set_state(state)
+
+        if 'generator' in meta:
+            self.rng.bit_generator.state = meta['generator']
+            entropy, spawn_key = meta['evaluation_seed']
+            self.evaluation_seed = entropy, tuple(spawn_key)
+            self.evaluations = meta['evaluations']
+
+        if self.cache is not None and 'cache' in meta:
+            self.cache.load(meta['cache'], arrays.pop('cache_fitness'))
+
+        return meta['generation'], arrays
+
+    def start_workers(self, ngen=None):
+        '''
+        Starts the workers for evaluating sub-population fitnesses, unless using a shared pool.
+        Inputs:
+            ngen unused; workers run until shut down
+        '''
+
+        self.problem.rng = self.rng
+
+        if self.own_pool:
+            self.pool = EvaluationPool(self.problem, **self.pool_options).start()
+
+        if self.instruments is not None:
+            self.instruments.attach(self.pool)
+
+    def compute_fitness(self, params, show_progress=True, threshold=None):
         '''
         Sends sub-populations to workers to compute fitness.
         Inputs:
             params        list of arrays of parameters from each population member
             show_progress flag for showing progress bar
+            threshold     optional racing threshold, passed to EvaluationPool.evaluate(); fitnesses of
+                          members cut short by racing are estimates, so they are not cached
         Returns: 
             a list of pairs of the form (params,fitness), one for each population member
             a count of the number of evaluation steps taken to compute the fitness
         '''
  
+        with self.timer('evaluation'):
+            population, steps = self._compute_fitness(params, show_progress, threshold)
+
+        if self.surrogate is not None and len(population) > 0:
+            with self.timer('screening'):
+                self._train_surrogate(population)
+
+        return population, steps
+
+    def screen(self, params, promising, minimum=1):
+        '''
+        Picks out the most promising screen_fraction of new individuals, using the surrogate's
+        predictions of their fitnesses, and counts the rest as evaluations saved.  Without a surrogate,
+        or before it has enough samples, all the individuals are kept.
+        Inputs:
+            params     list of arrays of parameters of the new individuals
+            promising  function taking the predicted fitnesses and returning the indices of the
+                       individuals, most promising first
+            minimum    smallest number of individuals to keep
+        Returns: a list of params of the individuals kept, in their original order
+        '''
+
+        if self.surrogate is None or not self.surrogate.ready or len(params) == 0:
+            return list(params)
+
+        with self.timer('screening'):
+            count = min(len(params), max(minimum, int(np.ceil(self.screen_fraction * len(params)))))
+            keep = np.sort(promising(self.surrogate.predict(np.asarray(params)))[:count])
+
+        self.evaluations_saved += len(params) - count
+
+        return [params[k] for k in keep]
+
+    @property
+    def surrogate_error(self):
+        '''
+        Mean absolute error of the surrogate's predictions of the fitnesses of the individuals
+        evaluated since it became ready, averaged over objectives
+        '''
+
+        return self.surrogate_errors / self.surrogate_predictions if self.surrogate_predictions > 0 else np.nan
+
+    def _train_surrogate(self, population):
+
+        X = np.array([p for p, _ in population])
+        F = np.array([f for _, f in population], dtype=float)
+
+        # Score the model on the new individuals before learning from them
+        if self.surrogate.ready:
+            self.surrogate_errors += np.mean(np.abs(self.surrogate.predict(X) - F)) * len(F)
+            self.surrogate_predictions += len(F)
+
+        self.surrogate.update(X, F)
+
+    def _compute_fitness(self, params, show_progress, threshold):
+
         self.prev_progress = 0
 
+        progress = self._show_progress if show_progress else None
+
+        if self.cache is None:
+            return self.pool.evaluate(params, progress, threshold, self.next_seed())
+
+        # Look up each member's fitness, sending only the first occurrence of each miss to the workers
         population = []
-        steps = 0
+        pending = collections.OrderedDict()
+        for p in params:
+            key = _FitnessCache.key(p)
+            if key in pending:
+                self.cache.hits += 1
+                pending[key].append(p)
+                continue
+            fitness = self.cache.get(key)
+            if fitness is not None:
+                population.append((p, fitness))
+            else:
+                pending[key] = [p]
 
-        # Compute size of sub-populations
-        evals_per_worker = self.pop_size // self.workers_count
-
-        # Send sub-populations to workers
-        for k,queue in enumerate(self.main_to_worker_queues):
-            queue.put(params[k*evals_per_worker:(k+1)*evals_per_worker])
-
-        # Get back population fitnesses and number of steps taken to compute
-        pop_size = evals_per_worker * self.workers_count
-        while len(population) < pop_size:
-            item = self.worker_to_main_queue.get()
-            population.append((item.params, item.fitness))
-            steps += item.steps
-            if show_progress:
-                self._show_progress(len(population))
-
-        # Evaulate remaining population members on main host
-        for p in params[pop_size:self.pop_size]:
-            f, s = self.problem.eval_params(p)
-            population.append((p,f))
-            steps += s
-            if show_progress:
-                self._show_progress(len(population))
+        evaluated, steps = (self.pool.evaluate([ps[0] for ps in pending.values()], progress, threshold, self.next_seed())
+                if pending else ([], 0))
+
+        # Cache the new fitnesses, sharing them with any duplicates
+        for p, fitness in evaluated:
+            key = _FitnessCache.key(p)
+            if threshold is None:
+                self.cache.put(key, fitness)
+            population.extend((q, fitness) for q in pending[key])
 
         return population, steps
-    
+
+    def next_seed(self):
+        '''
+        Returns: a np.random.SeedSequence for the next population or individual to be evaluated, to pass
+                 to EvaluationPool.evaluate() or submit()
+        '''
+
+        entropy, spawn_key = self.evaluation_seed
+        self.evaluations += 1
+
+        return np.random.SeedSequence(entropy, spawn_key=spawn_key+(self.evaluations-1,))
+
+    @property
+    def worker_utilization(self):
+        '''
+        Fraction of the evaluation time that each worker has spent busy
+        '''
+
+        return self.pool.worker_utilization
+
     def halt_workers(self):
         '''
-        Halts workers before they have completed the specified number of generations; for example, when
-        a desired maximum fitness has been achieved.
+        Halts workers before the run is over; for example, when a desired maximum fitness has been achieved.
+        A shared pool is left running.
         '''
-        for queue in self.main_to_worker_queues:
 
-            queue.put([])
+        if self.own_pool:
+            self.pool.stop()
 
     def shutdown_workers(self):
         '''
-        Shuts down workers after pausing a brief interval for them to complete.
+        Shuts down workers at the end of a run, finishes writing any checkpoint, and closes the
+        instrumentation sinks.  A shared pool is left running.
         '''
-        time.sleep(0.25)
-        for w in self.workers:
-            w.join()
 
-    def _worker_func(self, ngen, worker_id, main_to_worker_queue):
+        if self.own_pool:
+            self.pool.stop()
 
-        # Loop over generations, getting params, evaluating their fitnesses, and sending them back to main
-        for _ in range(ngen):
-            allparams = main_to_worker_queue.get()
-            if len(allparams) == 0: # main sends [] when done
-                break
-            for params in allparams:
-                fitness, steps = self.problem.eval_params(params)
-                self.worker_to_main_queue.put(_WorkerToMainItem(params=params, fitness=fitness, steps=steps))
+        self.checkpointer.wait()
+
+        if self.log is not None:
+            self.log.flush()
 
-    def _show_progress(self, ndone):
+        if self.instruments is not None:
+            self.instruments.close()
+
+    def _show_progress(self, ndone, total):
         wid = 93 # lines up with report
-        progress = wid * ndone // self.pop_size
+        progress = wid * ndone // total
         if progress > self.prev_progress:
-            print('\r[' + '*'*progress + ' '*(wid-progress) + ']', end=('\n' if ndone==self.pop_size else ''))
+            print('\r[' + '*'*progress + ' '*(wid-progress) + ']', end=('\n' if ndone==total else ''))
             self.prev_progress = progress
- 
@@ -14,12 +14,24 @@ from sueap.algorithms import GA
 
 class Elitist(GA):
 
-    def __init__(self, problem, pop_size, noise_std=0.01, parents_count=10, save_dir=None):
+    def __init__(self, problem, pop_size, noise_std=0.01, parents_count=10, save_dir=None, racing=False, **kwargs):
+        '''
+        Inputs:
+            problem       an object providing new_params(), eval_params() and mutate_params() methods
+            pop_size      population size
+            noise_std     standard deviation of mutation noise
+            parents_count number of fittest individuals from which the next population is drawn
+            save_dir      optional directory under saves/ for storing new best individuals
+            racing        after the first generation, race each individual against the current fitness
+                          of the last parent, using the problem's eval_race() method
+            kwargs        evaluation options passed to GA
+        '''
 
-        GA.__init__(self, problem, pop_size)
+        GA.__init__(self, problem, pop_size, **kwargs)
 
         self.noise_std = noise_std
         self.parents_count = parents_count
+        self.racing = racing
         self.max_fitness = None
 
         self.save_path = None
@@ -29,55 +41,82 @@ class Elitist(GA):
             self.save_path = os.path.join("saves", "%s" % save_dir)
             os.makedirs(self.save_path, exist_ok=True)
 
-    def run(self, ngen, max_fitness=None):
+    def run(self, ngen, max_fitness=None, resume=False):
         '''
         Inputs:
             ngen        Number of generations
             max_fitness optional fitness at which to halt
+            resume      continue from the checkpoint file, if there is one
         Returns: fittest individual
         '''
 
+        # Restore state from checkpoint if indicated
+        g0, state = GA.load_checkpoint(self) if resume else (0, None)
+
         # Set up communication with workers
         GA.start_workers(self, ngen)
 
         # Start with random population
-        population = [self.problem.new_params() for _ in range(self.pop_size)]
+        population = [self.problem.new_params() for _ in range(self.pop_size)] if state is None else list(state['population'])
 
         # This will store the fittest individual in the population and its fitness
-        best = None
+        best = None if state is None else (state['best_params'], state['best_fitness'][()])
+
+        # Fitness needed to be selected as a parent, used as racing threshold
+        threshold = None if state is None or 'threshold' not in state else state['threshold'][()]
+
+        # Fitness of the last saved best individual
+        if state is not None and 'saved_fitness' in state:
+            self.max_fitness = state['saved_fitness'][()]
 
         # Loop for specified number of generations (default = inf)
-        for gen_idx in range(ngen):
+        for gen_idx in range(g0, ngen):
 
             # Start timer for performance tracking
             t_start = time.time()
+            GA.begin_generation(self, gen_idx)
 
-            # Compute fitnesses of current population member
-            population, batch_steps = GA.compute_fitness(self, population)
+            # Compute fitnesses of the current population members that the surrogate, if any, picks out
+            population = GA.screen(self, population, self._promising, self.parents_count)
+            population, batch_steps = GA.compute_fitness(self, population, threshold=threshold)
 
             # Keep the current best in the population
             if best is not None:
                 population.append(best)
 
             # Sort population by fitness
-            population.sort(key=lambda p: p[1], reverse=True)
+            with self.timer('sorting'):
+                population.sort(key=lambda p: p[1], reverse=True)
 
             # Report and store current state
             self._report(population, gen_idx, batch_steps, t_start)
+            GA.log_population(self, [p[0] for p in population], [p[1] for p in population])
 
             # Get new best
             best = population[0]
 
+            # Individuals in the next generation will have to beat the current last parent
+            if self.racing:
+                threshold = population[self.parents_count-1][1]
+
             # Mutate the learnable parameters for each individual in the population
-            population = [self.problem.mutate_params(p[0], self.noise_std) for p in population]
+            with self.timer('variation'):
+                population = [self.problem.mutate_params(p[0], self.noise_std) for p in population]
 
             # Quit if maximum fitness reached
             if max_fitness is not None and best[1] >= max_fitness:
+                GA.end_generation(self, steps=batch_steps, best_fitness=float(best[1]))
                 GA.halt_workers(self)
                 break
 
             # Get next population
-            population = [population[np.random.randint(self.parents_count)] for _ in range(self.pop_size)]
+            with self.timer('selection'):
+                population = [population[self.rng.integers(self.parents_count)] for _ in range(self.pop_size)]
+
+            # Save state for resuming
+            self._save_checkpoint(gen_idx+1, population, best, threshold)
+
+            GA.end_generation(self, steps=batch_steps, best_fitness=float(best[1]))
 
         # Shut down workers after waiting a little for them to finish
         GA.shutdown_workers(self)
@@ -85,6 +124,145 @@ class Elitist(GA):
         # Return the fittest individual
         return best[0]
 
+    def run_async(self, ngen, max_fitness=None):
+        '''
+        Asynchronous steady-state version of run(): as soon as any worker returns a fitness, the result
+        goes into the set of parents, and a mutated child of a random parent is sent out for evaluation,
+        so the population never waits for the slowest evaluation.  Progress is reported after every
+        pop_size evaluations.  Since the parents depend on the order in which results come back, runs
+        with the same seed can differ.
+        Inputs:
+            ngen        Number of generations' worth (pop_size) of evaluations
+            max_fitness optional fitness at which to halt
+        Returns: fittest individual
+        '''
+
+        # Set up communication with workers
+        GA.start_workers(self)
+
+        # Keep enough individuals in flight to keep every worker busy
+        inflight = min(self.pop_size, max(1, 2*self.workers_count))
+        total = ngen * self.pop_size
+
+        # Parents, sorted by fitness, as (params, fitness) pairs
+        parents = []
+
+        # Start with random individuals, then send out children as results come back
+        submitted = 0
+        for _ in range(inflight):
+            self.pool.submit(self.problem.new_params(), seed=self.next_seed())
+            submitted += 1
+
+        t_start = time.time()
+        batch_steps = 0
+        halted = False
+
+        for evaluated in range(total):
+
+            params, fitness, steps = self.pool.receive()
+            batch_steps += steps
+
+            # Insert the result among the parents, dropping the weakest if there are too many
+            parents.append((params, fitness))
+            parents.sort(key=lambda p: p[1], reverse=True)
+            del parents[self.parents_count:]
+
+            # Quit if maximum fitness reached
+            if max_fitness is not None and parents[0][1] >= max_fitness:
+                halted = True
+
+            # Send out a new individual: random ones for the first generation, then mutated children
+            if not halted and submitted < total:
+                if submitted < self.pop_size:
+                    child = self.problem.new_params()
+                else:
+                    child = self.problem.mutate_params(parents[self.rng.integers(len(parents))][0], self.noise_std)
+                full = self.racing and len(parents) == self.parents_count
+                self.pool.submit(child, parents[-1][1] if full else None, self.next_seed())
+                submitted += 1
+
+            # Report once per generation's worth of evaluations
+            if (evaluated+1) % self.pop_size == 0 or submitted == evaluated+1:
+                self._report(parents, evaluated // self.pop_size, batch_steps, t_start)
+                t_start = time.time()
+                batch_steps = 0
+
+            # Stop when all submitted individuals are back
+            if submitted == evaluated+1:
+                break
+
+        # Shut down workers
+        GA.shutdown_workers(self)
+
+        # Return the fittest individual
+        return parents[0][0]
+
+    def island_start(self):
+        '''
+        Starts a sub-population for Islands.
+        Returns: island state: the fittest parents_count individuals, as (params, fitness) pairs sorted by fitness
+        '''
+
+        population, _ = GA.compute_fitness(self, [self.problem.new_params() for _ in range(self.pop_size)], False)
+
+        return self._parents(population)
+
+    def island_step(self, parents, g, G):
+        '''
+        Runs one generation on an island: mutated children of the parents, with the best parent kept.
+        Returns: new island state
+        '''
+
+        children = [self.problem.mutate_params(parents[self.rng.integers(len(parents))][0], self.noise_std)
+                for _ in range(self.pop_size)]
+
+        population, _ = GA.compute_fitness(self, GA.screen(self, children, self._promising, self.parents_count), False)
+
+        return self._parents(population + parents[:1])
+
+    def emigrants(self, parents, count):
+        '''
+        Returns the params and fitnesses of an island's count fittest individuals
+        '''
+
+        return [p[0] for p in parents[:count]], [p[1] for p in parents[:count]]
+
+    def immigrate(self, parents, params, fitnesses):
+        '''
+        Returns the island state with the given individuals added to compete with the parents
+        '''
+
+        return self._parents(parents + list(zip(params, fitnesses)))
+
+    def merge_islands(self, states):
+        '''
+        Returns the fittest individual from all islands
+        '''
+
+        return max((parents[0] for parents in states), key=lambda p: p[1])[0]
+
+    @staticmethod
+    def _promising(fitnesses):
+
+        return np.argsort(-fitnesses, kind='stable')
+
+    def _parents(self, population):
+
+        population.sort(key=lambda p: p[1], reverse=True)
+
+        return population[:self.parents_count]
+
+    def _save_checkpoint(self, generation, population, best, threshold):
+
+        optional = {}
+        if threshold is not None:
+            optional['threshold'] = threshold
+        if self.max_fitness is not None:
+            optional['saved_fitness'] = self.max_fitness
+
+        GA.save_checkpoint(self, generation, population=population, best_params=best[0], best_fitness=best[1],
+                **optional)
+
     def _report(self, population, gen_idx, batch_steps, t_start):
 
         # Report stats
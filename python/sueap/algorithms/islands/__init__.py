@@ -0,0 +1,142 @@
+'''
+Island-model parallel GA: each worker process owns a sub-population and runs the whole algorithm on
+it, periodically sending its best individuals to other islands
+
+Copyright (C) 2020 Simon D. Levy
+
+MIT License
+'''
+
+import queue
+import multiprocessing as mp
+import numpy as np
+
+def _ring(k, n, rng):
+
+    return [(k+1) % n]
+
+def _random(k, n, rng):
+
+    return [(k + rng.integers(1, n)) % n]
+
+def _full(k, n, rng):
+
+    return [j for j in range(n) if j != k]
+
+# Each topology maps an island index, the number of islands, and the island's random-number generator to the
+# islands that it sends migrants to
+TOPOLOGIES = {'ring':_ring, 'random':_random, 'full':_full}
+
+class Islands:
+    '''
+    Runs an algorithm (NSGA2 or Elitist) on several sub-populations at once, one per process.  Each
+    island evaluates its own individuals, so the only traffic between processes is the migrants.
+    Migrants are taken in as they arrive, so islands never wait for each other.
+
+        P = Islands(NSGA2, problem, 100, islands_count=8).run(250)
+    '''
+
+    def __init__(self, algorithm, problem, pop_size, islands_count=None, topology='ring', migration_interval=10,
+            migrants_count=2, seed=None, **kwargs):
+        '''
+        Inputs:
+            algorithm          algorithm class, providing island_start(), island_step(), emigrants(),
+                               immigrate() and merge_islands() methods
+            problem            problem for the algorithm
+            pop_size           population size of each island
+            islands_count      number of islands; default None uses all available CPUs
+            topology           'ring' (each island sends to the next), 'random' (to another island chosen
+                               at random each time), or 'full' (to every other island)
+            migration_interval number of generations between migrations
+            migrants_count     number of individuals sent by an island in each migration
+            seed               optional int or np.random.SeedSequence, from which each island's algorithm
+                               gets its own seed; since migrants are taken in as they arrive, runs with
+                               the same seed can still differ
+            kwargs             other options passed to the algorithm's constructor
+        '''
+
+        if topology not in TOPOLOGIES:
+            raise ValueError('Unknown topology %s; use one of %s' % (topology, ', '.join(TOPOLOGIES)))
+
+        self.algorithm = algorithm
+        self.problem = problem
+        self.pop_size = pop_size
+        self.islands_count = mp.cpu_count() if islands_count is None else islands_count
+        self.topology = TOPOLOGIES[topology]
+        self.migration_interval = migration_interval
+        self.migrants_count = migrants_count
+        self.seed_sequence = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+        self.kwargs = kwargs
+
+        # Number of migrants taken in by each island during the last run
+        self.immigrants = np.zeros(self.islands_count, dtype=int)
+
+    def run(self, ngen):
+        '''
+        Inputs:
+            ngen  Number of generations
+        Returns: the algorithm's merge_islands() result for the final islands; for NSGA2, a ranked
+                 population of the best individuals from all islands, and for Elitist, the fittest
+                 individual
+        '''
+
+        inboxes = [mp.Queue() for _ in range(self.islands_count)]
+        results = mp.Queue()
+
+        seeds = self.seed_sequence.spawn(self.islands_count)
+
+        islands = [mp.Process(target=self._island_func, args=(k, ngen, inboxes, results, seeds[k]))
+                for k in range(self.islands_count)]
+        for island in islands:
+            island.start()
+
+        states = [None] * self.islands_count
+        for _ in islands:
+            k, state, immigrants = results.get()
+            states[k] = state
+            self.immigrants[k] = immigrants
+
+        for island in islands:
+            island.join()
+
+        return self._make_ga().merge_islands(states)
+
+    def _make_ga(self, seed=None):
+
+        # Each island evaluates its own individuals
+        return self.algorithm(self.problem, self.pop_size, workers_count=0, seed=seed, **self.kwargs)
+
+    def _island_func(self, k, ngen, inboxes, results, seed):
+
+        ga = self._make_ga(seed)
+        ga.start_workers(ngen)
+
+        state = ga.island_start()
+        immigrants = 0
+
+        for g in range(ngen):
+
+            state = ga.island_step(state, g, ngen)
+
+            # Send our best to our neighbors, and take in whatever they've sent us
+            if self.islands_count > 1 and (g+1) % self.migration_interval == 0 and g < ngen-1:
+
+                params, fitnesses = ga.emigrants(state, self.migrants_count)
+                for j in self.topology(k, self.islands_count, ga.rng):
+                    inboxes[j].put((params, fitnesses))
+
+                while True:
+                    try:
+                        params, fitnesses = inboxes[k].get_nowait()
+                    except queue.Empty:
+                        break
+                    state = ga.immigrate(state, params, fitnesses)
+                    immigrants += len(params)
+
+        ga.shutdown_workers()
+
+        # Migrants still on their way are no longer needed, so don't wait for them to be delivered
+        for inbox in inboxes:
+            inbox.cancel_join_thread()
+
+        results.put((k, state, immigrants))
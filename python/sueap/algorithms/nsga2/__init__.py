@@ -7,97 +7,208 @@ MIT License
 '''
 
 import numpy as np
-import time
+import queue
+import bisect
+import threading
+import contextlib
 from sueap.algorithms import GA
+from sueap.indicators import hypervolume
 
 # Algorithms ---------------------------------------------------------------------------------------
 
-def _fast_non_dominated_sort(P):
-
-    F = [set()] # Fronts
-
-    for p in P:
-        p.S = set()
-        p.n = 0
-        for q in P:
-            if p < q:                # If p dominates q
-                p.S.add(q)           # Add q to the set of solutions dominated by p
-            elif q < p:
-                p.n += 1             # Increment the domination counter of p
-        if p.n == 0:                 # p belongs to the first front
-            p.rank = 1
-            F[0].add(p)
-    i = 0                            # Initialize the front counter
-    while len(F[i]) > 0:
-        Q = set()                    # Used to store the members of the next front
-        for p in F[i]:
-            for q in p.S:
-                q.n -= 1
-                if q.n == 0:         # q belongs to the next front
-                    q.rank = i+1
-                    Q.add(q)
-        i += 1
-        F.append(Q)
-
-    return F[:-1]
-
-def _crowding_distance_assignment(I, fsiz, fmin, fmax):
-
-    for p in I:                                  # initialize distance
-        p.distance = 0
-
-    for m in range(fsiz):                        # for each objective m
-        I = sorted(I, key=lambda self:self.f[m]) # sort using each objective value
-        I[0].distance = I[-1].distance = np.inf  # so that boundary points always selected
-        for i in range(1,len(I)-1):              # for all other points
-            I[i].distance += (I[i+1].f[m] - I[i-1].f[m]) /(fmax[m] - fmin[m])
-
-def _nsga_ii(P, Q, N, fsiz, fmin, fmax):
+# Maximum number of elements in a temporary dominance block; bounds memory for large populations
+_BLOCK_SIZE = 1 << 22
+
+def _dominates(f, rows, cols, c):
+    '''
+    Returns a boolean matrix D with D[i,j] true iff f[rows[i]] dominates f[cols[j]]
+    '''
+    return np.all(c(f[rows,np.newaxis,:], f[np.newaxis,cols,:]), axis=2)
+
+def _signs(fitcmp, fsiz):
+    '''
+    Returns a vector of each objective's sign in minimized form: 1 for an objective that fitcmp
+    minimizes, and -1 for one that it maximizes
+    '''
+    return np.where(fitcmp(np.zeros(fsiz), np.ones(fsiz)), 1., -1.)
+
+def _blocks(rows, ncols, fsiz):
+
+    step = max(1, _BLOCK_SIZE // max(1, ncols*fsiz))
+    for k in range(0, len(rows), step):
+        yield rows[k:k+step]
+
+def _non_dominated_fronts(f, c):
+    '''
+    Array-based version of the fast non-dominated sort from Deb et al. (2002).
+    Inputs:
+        f  N x fsiz matrix of fitnesses
+        c  fitness comparison function, applied elementwise with broadcasting
+    Returns: list of index arrays (F_1, F_2, ...), one for each nondominated front
+    '''
+
+    f = np.asarray(f)
+    N, fsiz = f.shape
+    everyone = np.arange(N)
+
+    # n[q] = number of solutions that dominate q, computed a block of rows at a time
+    n = np.zeros(N, dtype=int)
+    for rows in _blocks(everyone, N, fsiz):
+        D = _dominates(f, rows, everyone, c)
+        D[np.arange(len(rows)), rows] = False    # p never counts itself
+        n += np.sum(D, axis=0)
+
+    F = []                                       # Fronts
+    front = everyone[n == 0]                     # First front
+    remaining = everyone[n > 0]
+    while len(front) > 0:
+        F.append(front)
+        for rows in _blocks(front, len(remaining), fsiz):
+            n[remaining] -= np.sum(_dominates(f, rows, remaining, c), axis=0)
+        done = n[remaining] == 0                 # q belongs to the next front
+        front = remaining[done]
+        remaining = remaining[~done]
+
+    return F
+
+def _crowding_distance_assignment(f, fmin=None, fmax=None):
+    '''
+    Computes crowding distances for a front.
+    Inputs:
+        f     front size x fsiz matrix of fitnesses
+        fmin  lower objective bounds for normalization, or None to use the front's observed range
+        fmax  upper objective bounds for normalization, or None to use the front's observed range
+    Returns: vector of crowding distances
+    '''
+
+    L = len(f)
+    d = np.zeros(L)                                      # initialize distance
+
+    if L < 3:                                            # every point is a boundary point
+        d[:] = np.inf
+        return d
+
+    I = np.argsort(f, axis=0, kind='stable')             # sort using each objective value
+    fs = np.take_along_axis(f, I, axis=0)
+
+    span = fs[-1] - fs[0] if fmin is None else np.asarray(fmax) - np.asarray(fmin)
+    span = np.where(span == 0, 1, span)                  # avoid dividing by zero on a flat objective
+
+    gaps = (fs[2:] - fs[:-2]) / span                     # for all other points
+    for m in range(f.shape[1]):                          # for each objective m
+        d[I[1:-1,m]] += gaps[:,m]
+
+    d[I[0]] = d[I[-1]] = np.inf                          # so that boundary points always selected
+
+    return d
+
+def _untimed(phase):
+
+    return contextlib.nullcontext()
+
+def _nsga_ii(P, Q, N, fitcmp, fmin=None, fmax=None, timer=_untimed):
 
     # Core algorithm from Deb et al. (2002)
-    R = list(P.union(Q))                                            # Combine parent and offspring population
-    F = _fast_non_dominated_sort(R)                                 # F = (F_1, F_2, ...), all nondominated fronts of R_t
-    P, i = set(), 0
-    while (len(P) + len(F[i])) < N:                                 # Until the parent population is filled
-        _crowding_distance_assignment(list(F[i]), fsiz, fmin, fmax) # Calculate crowding-distance in F_i
-        P = P.union(F[i])                                           # Include ith nondominated front in the parent pop
+    R = P.union(Q)                                                  # Combine parent and offspring population
+    with timer('sorting'):
+        F = _non_dominated_fronts(R.f, fitcmp)                      # F = (F_1, F_2, ...), all nondominated fronts of R_t
+    P, n, i = [], 0, 0
+    while True:
+        R.rank[F[i]] = i+1
+        with timer('crowding'):
+            R.distance[F[i]] = _crowding_distance_assignment(R.f[F[i]], # Calculate crowding-distance in F_i
+                    fmin, fmax)
+        if n + len(F[i]) >= N:                                      # Until the parent population is filled
+            break
+        P.append(F[i])                                              # Include ith nondominated front in the parent pop
+        n += len(F[i])
         i += 1                                                      # Check the next front for inclusion
-    F[i] = sorted(F[i], key=lambda self:self.n)                     # Sort in descending order using <_n
-    P = P.union(F[i][:(N-len(P))])                                  # Choose the first (N-|P_{t+1}) elements of F_i
+    last = np.argsort(-R.distance[F[i]], kind='stable')             # Sort in descending order using <_n
+    P.append(F[i][last[:(N-n)]])                                    # Choose the first (N-|P_{t+1}) elements of F_i
 
-    return P
+    return R[np.concatenate(P)]
 
 # Internal classes ----------------------------------------------------------------------------------
 
-class _Individual:
+# Seconds the frame writer waits for a frame before checking whether it has been closed
+_POLL_INTERVAL = 0.1
+
+class _Frames:
     '''
-    A class to support sorting of individuals in a population
+    A bounded queue of snapshots of a population's fitnesses, shared between the GA and a plotter or
+    frame writer.  Putting a frame never blocks: when the queue is full, the oldest frame is dropped.
     '''
 
-    def __init__(self, x, c, f=None):
+    def __init__(self, maxsize):
+
+        self.queue = queue.Queue(maxsize)
+        self.dropped = 0
 
-        self.x = x
-        self.c = c
-        self.f= f
+    def put(self, frame):
 
-        self.S        = None
-        self.rank     = None
-        self.n        = None
-        self.distance = None
+        while True:
+            try:
+                self.queue.put_nowait(frame)
+                return
+            except queue.Full:
+                try:
+                    self.queue.get_nowait()
+                    self.dropped += 1
+                except queue.Empty:
+                    pass
 
-    def __lt__(self, other):
+    def get(self, block=True, timeout=None):
         '''
-        p < q means p dominates q.
+        Returns the oldest frame, or None if there isn't one without blocking or within the timeout
         '''
-        return np.all(self.c(self.f, other.f))
 
-    def __str__(self):
+        try:
+            return self.queue.get(block, timeout)
+        except queue.Empty:
+            return None
 
-        return str((self.x, self.f))
+    def latest(self):
+        '''
+        Returns the newest frame, dropping any older ones, or None if there isn't one
+        '''
+
+        frame = None
+        while True:
+            newer = self.get(False)
+            if newer is None:
+                return frame
+            if frame is not None:
+                self.dropped += 1
+            frame = newer
+
+def _snapshot(P, g, G, axes):
+    '''
+    Returns a frame for _Frames: a copy of the plotted fitnesses, with the generation indices
+    '''
+
+    return P.f[:,axes].copy(), g, G
+
+def _setup_axes(ax, fmin, fmax, axes):
+
+    ln, = ax.plot([], [], 'r.')
+    ax.set_xlim((fmin[0], fmax[0]))
+    ax.set_ylim((fmin[1], fmax[1]))
+    ax.set_xlabel('$f_%d$' % axes[0])
+    ax.set_ylabel('$f_%d$' % axes[1])
+    ax.set_aspect('equal')
+
+    return ln
+
+def _draw_frame(ax, ln, frame):
+
+    f, g, G = frame
+    ln.set_data(f[:,0], f[:,1])
+    ax.set_title('%d/%d' % (g+1,G))
 
 class _Plotter:
     '''
-    A class for animated 2D fitness plots
+    A class for animated 2D fitness plots.  The GA thread reports into a queue without waiting, and
+    the plot shows the newest generation each time it is redrawn.
     '''
 
     def __init__(self, fmin, fmax, axes, imagename):
@@ -105,61 +216,379 @@ class _Plotter:
         import matplotlib.pyplot as plt
 
         self.fig, self.ax = plt.subplots()
-        self.ln, = plt.plot([], [], 'r.')
-        self.ax.set_xlim((fmin[0], fmax[0]))
-        self.ax.set_ylim((fmin[1], fmax[1]))
-        self.ax.set_xlabel('$f_%d$' % axes[0])
-        self.ax.set_ylabel('$f_%d$' % axes[1])
-        self.ax.set_aspect('equal')
+        self.ln = _setup_axes(self.ax, fmin, fmax, axes)
 
-        self.imagename = imagename
-        self.g = None
-        self.gprev = None
         self.plt = plt
         self.axes = axes
         self.ani = None
         self.done = False
 
+        self.frames = _Frames(1)
+
+        # Images are written by a separate, headless writer so that saving doesn't hold up the plot
+        self.writer = None if imagename is None else FrameWriter(imagename, fmin, fmax, axes)
+
     def start(self):
 
         from matplotlib.animation import FuncAnimation
 
-        self.ani = FuncAnimation(self.fig, self._animate, blit=False)
+        self.ani = FuncAnimation(self.fig, self._animate, blit=False, cache_frame_data=False)
         self.plt.show()
 
-    def _animate(self, _):
+        if self.writer is not None:
+            self.writer.close()
 
-        if self.imagename is not None:
-            if self.g is not None:
-                if self.g != self.gprev:
-                    self.plt.savefig('%s_%04d.png' % (self.imagename, self.g))
-                    self.gprev = self.g
+    def _animate(self, _):
 
-        self.fig.canvas.draw()
-        self.fig.canvas.flush_events()
+        frame = self.frames.latest()
+        if frame is not None:
+            _draw_frame(self.ax, self.ln, frame)
 
         if not self.done:
             return self.ln,
 
     def report(self, P, g, G):
 
-        P = list(P)
-        self.ln.set_data([p.f[self.axes[0]] for p in P], [p.f[self.axes[1]] for p in P])
-        self.ax.set_title('%d/%d' % (g+1,G))
-        self.g = g
-        time.sleep(1.0)
+        self.frames.put(_snapshot(P, g, G, self.axes))
+
+        if self.writer is not None:
+            self.writer.report(P, g, G)
 
 # Exported classes ----------------------------------------------------------------------------------
 
+class Population:
+    '''
+    A population stored as arrays, one row per individual
+    '''
+
+    def __init__(self, x, f=None):
+        '''
+        Inputs:
+            x  N x ndim array of parameters
+            f  optional N x fsiz array of fitnesses
+        '''
+
+        self.x = np.asarray(x)
+        self.f = None if f is None else np.asarray(f)
+
+        self.rank     = np.zeros(len(self.x), dtype=int)
+        self.distance = np.zeros(len(self.x))
+
+    def __len__(self):
+
+        return len(self.x)
+
+    def __getitem__(self, idx):
+        '''
+        Returns the sub-population selected by an index array or slice
+        '''
+
+        P = Population(self.x[idx], None if self.f is None else self.f[idx])
+        P.rank = self.rank[idx]
+        P.distance = self.distance[idx]
+        return P
+
+    def union(self, other):
+        '''
+        Returns a new population containing the members of this one followed by those of other
+        '''
+
+        P = Population(np.concatenate((self.x, other.x)), np.concatenate((self.f, other.f)))
+        P.rank = np.concatenate((self.rank, other.rank))
+        P.distance = np.concatenate((self.distance, other.distance))
+        return P
+
+    def __str__(self):
+
+        return str((self.x, self.f))
+
+class ParetoArchive:
+    '''
+    A bounded archive of the non-dominated individuals found so far, updated as each population is
+    evaluated, so that good individuals later crowded out of the population are not lost.  With two
+    objectives the archive is kept as a skyline sorted on the first objective, so that offering it an
+    individual takes a binary search; with more, an individual is checked against the whole archive
+    with one array comparison.  When the archive is over capacity, its most crowded members are dropped.
+    '''
+
+    def __init__(self, capacity, fitcmp, fmin=None, fmax=None):
+        '''
+        Inputs:
+            capacity maximum number of individuals kept
+            fitcmp   the problem's fitness comparison function; each objective must be compared by < or >
+            fmin     lower objective bounds for normalizing crowding distances, or None to use the
+                     archive's observed range
+            fmax     upper objective bounds, likewise
+        '''
+
+        self.capacity = capacity
+        self.fitcmp = fitcmp
+        self.fmin = fmin
+        self.fmax = fmax
+
+        # Each objective's sign in minimized form, found from fitcmp on the first update
+        self.sign = None
+
+        # Members' params, fitnesses, and minimized fitnesses: lists in skyline order with two
+        # objectives, and arrays with more
+        self.xs, self.fs, self.gs = [], [], []
+
+        # Numbers of individuals that have entered the archive, and of those dropped for lack of room
+        self.added = 0
+        self.pruned = 0
+
+    def __len__(self):
+
+        return len(self.fs)
+
+    @property
+    def x(self):
+
+        return np.array(self.xs)
+
+    @property
+    def f(self):
+
+        return np.array(self.fs)
+
+    @property
+    def population(self):
+        '''
+        The archive as a Population, with every member in the first front and crowding distances set
+        '''
+
+        P = Population(self.xs, self.fs)
+        P.rank[:] = 1
+        if len(P) > 0:
+            P.distance = _crowding_distance_assignment(P.f, self.fmin, self.fmax)
+        return P
+
+    def update(self, X, F):
+        '''
+        Offers individuals to the archive.
+        Inputs:
+            X  N x ndim array of parameters
+            F  N x fsiz array of fitnesses
+        Returns: number of the individuals that entered the archive
+        '''
+
+        F = np.asarray(F, dtype=float)
+        if len(F) == 0:
+            return 0
+
+        if self.sign is None:
+            self.sign = _signs(self.fitcmp, F.shape[1])
+            if F.shape[1] != 2:
+                self.xs, self.fs, self.gs = np.asarray(X)[:0], F[:0], F[:0]
+
+        G = self.sign * F
+
+        added = self._insert_skyline(X, F, G) if F.shape[1] == 2 else self._insert(X, F, G)
+        self.added += added
+
+        if len(self) > self.capacity:
+            self._prune()
+
+        return added
+
+    def _insert_skyline(self, X, F, G):
+
+        # In minimized form, members sorted by first objective have non-increasing second objectives
+        us = [g[0] for g in self.gs]
+
+        added = 0
+
+        for x, f, (u, v) in zip(X, F, G):
+
+            lo = bisect.bisect_left(us, u)
+            hi = bisect.bisect_right(us, u)
+
+            # Skip an individual dominated by a member better in the first objective (of which the last
+            # is best in the second), or already in the archive
+            if (lo > 0 and self.gs[lo-1][1] < v) or any(self.gs[k][1] == v for k in range(lo, hi)):
+                continue
+
+            # Remove the members it dominates, which follow those tied with it in the first objective
+            end = hi
+            while end < len(us) and self.gs[end][1] > v:
+                end += 1
+
+            # Put it among those tied with it in order of the second objective
+            pos = lo
+            while pos < hi and self.gs[pos][1] > v:
+                pos += 1
+
+            for members, item in ((us, u), (self.xs, x), (self.fs, f), (self.gs, (u, v))):
+                del members[hi:end]
+                members.insert(pos, item)
+
+            added += 1
+
+        return added
+
+    def _insert(self, X, F, G):
+
+        added = 0
+
+        for x, f, g in zip(X, F, G):
+
+            if np.any(np.all(self.gs < g, axis=1) | np.all(self.gs == g, axis=1)):
+                continue
+
+            keep = ~np.all(g < self.gs, axis=1)
+            self.xs = np.concatenate((self.xs[keep], [x]))
+            self.fs = np.concatenate((self.fs[keep], [f]))
+            self.gs = np.concatenate((self.gs[keep], [g]))
+
+            added += 1
+
+        return added
+
+    def _prune(self):
+
+        # Drop the most crowded members a few at a time, recomputing the distances in between so that
+        # whole clusters aren't dropped at once
+        while len(self) > self.capacity:
+
+            excess = len(self) - self.capacity
+            d = _crowding_distance_assignment(self.f, self.fmin, self.fmax)
+            keep = np.ones(len(self), dtype=bool)
+            keep[np.argsort(d, kind='stable')[:max(1, excess//2)]] = False
+
+            if isinstance(self.fs, list):
+                self.xs, self.fs, self.gs = ([m for m, k in zip(members, keep) if k]
+                        for members in (self.xs, self.fs, self.gs))
+            else:
+                self.xs, self.fs, self.gs = self.xs[keep], self.fs[keep], self.gs[keep]
+
+            self.pruned += int(np.sum(~keep))
+
+class FrameWriter:
+    '''
+    A reporter that draws 2D fitness plots off-screen (with matplotlib's Agg backend, so no display
+    is needed) and saves them as PNG images or an animated GIF.  Drawing happens on a background
+    thread fed by a bounded queue, so reporting never slows down the GA; if the writer falls behind,
+    intermediate generations are dropped, but the last one reported is always written.
+    '''
+
+    def __init__(self, imagename, fmin, fmax, axes=(0,1), gif=False, duration=100, queue_size=4):
+        '''
+        Inputs:
+            imagename  prefix for image file names: images are saved as imagename_GGGG.png, or as
+                       imagename.gif
+            fmin       lower plot limits
+            fmax       upper plot limits
+            axes       axis indices for 2D plot
+            gif        save an animated GIF (which requires Pillow) instead of PNG images
+            duration   milliseconds per GIF frame
+            queue_size maximum number of frames waiting to be drawn; use the number of generations
+                       to keep every frame
+        '''
+
+        self.imagename = imagename
+        self.fmin = fmin
+        self.fmax = fmax
+        self.axes = axes
+        self.gif = gif
+        self.duration = duration
+
+        self.frames = _Frames(queue_size)
+        self.written = 0
+
+        # Set by close(); a stop signal in the queue itself could be dropped by frames reported after it
+        self.stopped = threading.Event()
+
+        self.thread = threading.Thread(target=self._write)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def report(self, P, g, G):
+
+        # Frames reported after closing, as by a GA still running when its plot window is closed, are ignored
+        if self.stopped.is_set():
+            return
+
+        self.frames.put(_snapshot(P, g, G, self.axes))
+
+    @property
+    def dropped(self):
+        '''
+        Number of generations reported but not written
+        '''
+
+        return self.frames.dropped
+
+    def close(self):
+        '''
+        Waits for the queued frames to be written, and saves the GIF if indicated
+        '''
+
+        self.stopped.set()
+        self.thread.join()
+
+    def __enter__(self):
+
+        return self
+
+    def __exit__(self, *args):
+
+        self.close()
+
+    def _write(self):
+
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+        fig = Figure()
+        canvas = FigureCanvasAgg(fig)
+        ax = fig.add_subplot()
+        ln = _setup_axes(ax, self.fmin, self.fmax, self.axes)
+
+        images = []
+
+        while True:
+
+            # Stop once closed with no frames left
+            frame = self.frames.get(timeout=_POLL_INTERVAL)
+            if frame is None:
+                if self.stopped.is_set():
+                    break
+                continue
+
+            _draw_frame(ax, ln, frame)
+
+            if self.gif:
+                from PIL import Image
+                canvas.draw()
+                images.append(Image.fromarray(np.asarray(canvas.buffer_rgba())).convert('RGB'))
+            else:
+                fig.savefig('%s_%04d.png' % (self.imagename, frame[1]))
+
+            self.written += 1
+
+        if len(images) > 0:
+            images[0].save(self.imagename + '.gif', save_all=True, append_images=images[1:],
+                    duration=self.duration, loop=0)
+
 class NSGA2(GA):
 
-    def __init__(self, problem, pop_size):
+    def __init__(self, problem, pop_size, observed_range=False, archive_size=None, **kwargs):
         '''
         Inputs:
-            problem  an object providing new_params() and eval_params() methods
-            pop_size Population size
+            problem        an object providing new_params() and eval_params() methods
+            pop_size       Population size
+            observed_range normalize crowding distances by each front's observed range instead of fmin, fmax
+            archive_size   maximum number of non-dominated individuals kept in the archive returned by
+                           run(); default None uses pop_size
+            kwargs         evaluation options passed to GA
         '''
-        GA.__init__(self, problem, pop_size)
+        GA.__init__(self, problem, pop_size, **kwargs)
+
+        self.observed_range = observed_range
+        self.archive_size = pop_size if archive_size is None else archive_size
+
+        # Set up by run()
+        self.archive = None
 
     def animate(self, ngen, axes=(0,1), imagename=None):
         '''
@@ -169,91 +598,255 @@ class NSGA2(GA):
             imagename  Prefix for image file names
         '''
 
-        from threading import Thread
-
         plotter = _Plotter(self.problem.fmin, self.problem.fmax, axes, imagename)
 
-        thread = Thread(target=self.run, args=(ngen, plotter, False))
+        thread = threading.Thread(target=self.run, args=(ngen, plotter, False))
         thread.daemon = True
         thread.start()
 
         # Plot runs on main thread
         plotter.start() 
 
-    def run(self, ngen, reporter, show_progress=True):
+    def record(self, ngen, imagename, axes=(0,1), gif=False):
+        '''
+        Runs without a display, saving a plot of each generation's fitnesses with a FrameWriter.
+        Inputs:
+            ngen       Number of generations
+            imagename  Prefix for image file names
+            axes       Axis indices for 2D plot
+            gif        save an animated GIF instead of PNG images
+        '''
+
+        with FrameWriter(imagename, self.problem.fmin, self.problem.fmax, axes, gif) as writer:
+            self.run(ngen, writer, False)
+
+    def run(self, ngen, reporter, show_progress=True, resume=False, tolerance=None, patience=10, reference=None):
+        '''
+        Inputs:
+            ngen          Number of generations
+            reporter      an object providing a report(P, g, G) method, called once per generation
+            show_progress flag for showing progress bar
+            resume        continue from the checkpoint file, if there is one
+            tolerance     optional relative hypervolume improvement below which to halt: the run stops
+                          once the hypervolume of the first front has grown by less than this fraction
+                          over the last patience generations
+            patience      number of generations over which to measure the improvement
+            reference     hypervolume reference point, in the problem's own units, worse than the front
+                          in every objective; by default, the worst end of the problem's range (fmax
+                          for a minimized objective, fmin for a maximized one) pushed out by a tenth of
+                          the range, or with observed_range, the worst of the starting population
+                          pushed out by a tenth of its range
+        Returns: a ParetoArchive of the non-dominated individuals found over the whole run
+        '''
+
+        # Restore state from checkpoint if indicated
+        g0, state = GA.load_checkpoint(self) if resume else (0, None)
 
         # Set up communication with workers
         GA.start_workers(self, ngen)
 
-        # Create initial population and get its fitness
-        P = self._eval_fits(set([_Individual(self.problem.new_params(), self.problem.fitcmp) 
-            for _ in range(self.pop_size)]), show_progress)
+        self.archive = ParetoArchive(self.archive_size, self.problem.fitcmp, *self._bounds())
+
+        if state is None:
+
+            # Create initial population and get its fitness
+            P = self._eval_fits([self.problem.new_params() for _ in range(self.pop_size)], show_progress)
+            self._update_archive(P)
+
+            # Create empty child population
+            Q = P[:0]
+
+        else:
 
-        # Create empty child population
-        Q = set()
+            P = Population(state['P_x'], state['P_f'])
+            Q = Population(state['Q_x'], state['Q_f'])
+            if 'A_f' in state:
+                self._update_archive(Population(state['A_x'], state['A_f']))
 
-        for g in range(ngen):
+        # Hypervolumes of the first front, for halting on convergence, computed on minimized objectives
+        if tolerance is not None:
+            sign = _signs(self.problem.fitcmp, P.f.shape[1])
+            saved = state is not None and 'H_ref' in state
+            if reference is not None:
+                reference = sign * np.asarray(reference, dtype=float)
+            elif saved:
+                reference = state['H_ref']
+            elif self.observed_range:
+                lo, hi = np.min(sign * P.f, axis=0), np.max(sign * P.f, axis=0)
+                reference = hi + np.where(hi > lo, hi - lo, 1) / 10
+            else:
+                lo, hi = np.sort([sign * np.asarray(self.problem.fmin), sign * np.asarray(self.problem.fmax)], axis=0)
+                reference = hi + np.where(hi > lo, hi - lo, 1) / 10
+
+            # A resumed run picks up the hypervolumes measured against the same reference
+            volumes = list(state['H_volumes']) if saved and np.array_equal(state['H_ref'], reference) else []
+
+        for g in range(g0, ngen):
+
+            GA.begin_generation(self, g)
 
             # Run the NSGA-II algorithm on current parents and children, getting new population
-            P = _nsga_ii(P, Q, self.pop_size, self.problem.fsiz, self.problem.fmin, self.problem.fmax)
+            P = _nsga_ii(P, Q, self.pop_size, self.problem.fitcmp, *self._bounds(), timer=self.timer)
 
             # Get new child population through selection, mutation, crossover
             Q = self.make_new_pop(P, g, ngen)     
 
             # Plot or report results
             reporter.report(P, g, ngen)
+            GA.log_population(self, P.x, P.f, P.rank)
+
+            # Quit if the front has reached the reference box and stopped improving
+            if tolerance is not None:
+                volumes.append(hypervolume(sign * P.f[P.rank==1], reference))
+                if len(volumes) > patience and volumes[-1] > 0 and volumes[-1] - volumes[-1-patience] <= tolerance * volumes[-1]:
+                    GA.end_generation(self, fronts=int(np.max(P.rank)), hypervolume=volumes[-1])
+                    break
 
             # Compute child fitnesses on all but last generation (avoids blocking)
             if g<ngen-1:
-                Q = self._eval_fits(Q, show_progress)
+                Q = self._eval_fits(self._screen(Q.x), show_progress)
+                self._update_archive(Q)
+                GA.save_checkpoint(self, g+1, P_x=P.x, P_f=P.f, Q_x=Q.x, Q_f=Q.f, A_x=self.archive.x, A_f=self.archive.f,
+                        **({} if tolerance is None else {'H_ref':reference, 'H_volumes':volumes[-1-patience:]}))
+
+            GA.end_generation(self, fronts=int(np.max(P.rank)),
+                    **({} if tolerance is None else {'hypervolume':volumes[-1]}))
 
         # Shut down workers after waiting a little for them to finish
         GA.shutdown_workers(self)
 
-    def _eval_fits(self, P, show_progress):
+        return self.archive
+
+    def island_start(self):
+        '''
+        Starts a sub-population for Islands.
+        Returns: island state: parent and evaluated child populations
+        '''
+
+        P = self._eval_fits([self.problem.new_params() for _ in range(self.pop_size)], False)
+
+        return P, P[:0]
+
+    def island_step(self, state, g, G):
+        '''
+        Runs one generation of NSGA-II on an island, evaluating the children.
+        Returns: new island state
+        '''
+
+        P, Q = state
+
+        P = _nsga_ii(P, Q, self.pop_size, self.problem.fitcmp, *self._bounds())
+
+        return P, self._eval_fits(self._screen(self.make_new_pop(P, g, G).x), False)
+
+    def emigrants(self, state, count):
+        '''
+        Returns the params and fitnesses of an island's count best parents, by rank and then crowding distance
+        '''
+
+        P, _ = state
+
+        best = np.lexsort((-P.distance, P.rank))[:count]
+
+        return P.x[best], P.f[best]
+
+    def immigrate(self, state, params, fitnesses):
+        '''
+        Returns the island state with the given individuals added to the children, to compete for
+        places in the next generation
+        '''
+
+        P, Q = state
+
+        return P, Q.union(Population(params, fitnesses))
+
+    def merge_islands(self, states):
+        '''
+        Returns a population of the best individuals from all islands, ranked and crowded together
+        '''
+
+        P = Population(np.concatenate([P.x for P, _ in states]), np.concatenate([P.f for P, _ in states]))
+        Q = Population(np.concatenate([Q.x for _, Q in states]), np.concatenate([Q.f for _, Q in states]))
+
+        return _nsga_ii(P, Q, len(P), self.problem.fitcmp, *self._bounds())
+
+    def _screen(self, X):
+
+        return GA.screen(self, list(X), self._promising)
+
+    def _promising(self, F):
+
+        # Predicted fitnesses in order of rank and then crowding distance, as _nsga_ii would select them
+        rank = np.zeros(len(F), dtype=int)
+        distance = np.zeros(len(F))
+        for i, front in enumerate(_non_dominated_fronts(F, self.problem.fitcmp)):
+            rank[front] = i+1
+            distance[front] = _crowding_distance_assignment(F[front], *self._bounds())
+
+        return np.lexsort((-distance, rank))
+
+    def _update_archive(self, P):
+
+        with self.timer('archive'):
+            self.archive.update(P.x, P.f)
+
+    def _bounds(self):
+
+        return (None, None) if self.observed_range else (self.problem.fmin, self.problem.fmax)
+
+    def _eval_fits(self, X, show_progress):
 
         # Send population parameters to workers
-        fs, _ = GA.compute_fitness(self, [p.x for p in P], show_progress)
+        fs, _ = GA.compute_fitness(self, list(X), show_progress)
 
         # Rebuild population with parameters and fitnesses
-        return set([_Individual(x, self.problem.fitcmp, f) for x,f in fs])
+        return Population([x for x,_ in fs], [f for _,f in fs])
 
     def make_new_pop(self, P, g, G):
         '''
-        Standard implementation of make_new_pop:
-            - tournament selection
-            - crossover
-            - mutation
+        Standard implementation of make_new_pop, on whole arrays of individuals at once:
+            - binary tournament selection by crowded comparison (lower rank, then larger crowding distance)
+            - crossover, using the problem's crossover_batch(X1, X2) method if it has one, and otherwise
+              calling crossover(x1, x2) for each child
+            - mutation, using the problem's mutate_batch(X, g, G) method if it has one, and otherwise
+              calling mutate(x, g, G) for each child
         Inputs:
-            P   a population
+            P   a population, ranked and crowded by _nsga_ii
             g   current generation (for scaling mutation)
             G   total number of generations (for scaling mutation)
+        Returns: a population of children, whose fitnesses have not yet been computed
         '''
-     
-        Q = set()
 
         # goal is N children
         N = len(P)
 
-        # tournament selection
-        selected = set()
-        for _ in range(N):
-            p1 = self._pick(P)
-            p2 = self._pick(P)
-            selected.add(p1 if p1 < p2 else p2)
+        # tournament selection, for each child and its mate
+        with self.timer('selection'):
+            a = self.rng.integers(N, size=(2,N))
+            b = self.rng.integers(N, size=(2,N))
+            a_wins = (P.rank[a] < P.rank[b]) | ((P.rank[a] == P.rank[b]) & (P.distance[a] > P.distance[b]))
+            parents, mates = np.where(a_wins, a, b)
 
         # recombination (crossover) and mutation
-        for _ in range(N):
-            child = self._pick(selected)
-            x = self.problem.crossover(child, self._pick(selected)) if np.random.random()<self.problem.pc else child.x
-            x = self.problem.mutate(x, g, G) # scale mutation by fraction of generations completed
-            q = _Individual(x, self.problem.fitcmp)
-            Q.add(q)
+        with self.timer('variation'):
+            X = P.x[parents]
+            cross = self.rng.random(N) < self.problem.pc
+            if np.any(cross):
+                X[cross] = self._crossover(X[cross], P.x[mates[cross]])
+            X = self._mutate(X, g, G) # scale mutation by fraction of generations completed
 
-        return Q
+        return Population(X)
 
-    def _pick(self, P):
-        '''
-        Returns a randomly-chosen individual from set P
-        '''
-        return np.random.choice(tuple(P))
+    def _crossover(self, X1, X2):
+
+        if hasattr(self.problem, 'crossover_batch'):
+            return self.problem.crossover_batch(X1, X2)
+
+        return np.array([self.problem.crossover(x1, x2) for x1, x2 in zip(X1, X2)])
+
+    def _mutate(self, X, g, G):
+
+        if hasattr(self.problem, 'mutate_batch'):
+            return self.problem.mutate_batch(X, g, G)
+
+        return np.array([self.problem.mutate(x, g, G) for x in X])
@@ -0,0 +1,360 @@
+'''
+Standard multi-objective test problems for benchmarking SUEAP algorithms
+
+Problems are from Zitzler, Deb, and Thiele (2000) (ZDT1-ZDT6), Deb, Thiele, Laumanns, and Zitzler (2002)
+(DTLZ1-DTLZ7), Fonseca and Fleming (1993) (FON), and Poloni (1995) (POL), and use the same interface as
+the Fon class in nsga2-fon.py.  All objectives are minimized.
+
+Copyright (C) 2020 Simon D. Levy
+
+MIT License
+'''
+
+import numpy as np
+
+from sueap.indicators import _nondominated
+
+# Helpers ------------------------------------------------------------------------------------------
+
+def _sphere(theta, r):
+    '''
+    Maps angles theta (N x M-1) and radii r (N) to points on the spherical DTLZ front shape
+    '''
+
+    M = theta.shape[1] + 1
+    F = np.empty((len(r), M))
+    for i in range(M):
+        F[:,i] = r * np.prod(np.cos(theta[:,:M-1-i]), axis=1)
+        if i > 0:
+            F[:,i] *= np.sin(theta[:,M-1-i])
+    return F
+
+# Base class ---------------------------------------------------------------------------------------
+
+class _Problem:
+    '''
+    A real-valued problem with box bounds, bounded Gaussian mutation, and one-point crossover,
+    as in the Matlab examples/Deb problems
+    '''
+
+    PM   = .01
+    PC   = .7
+
+    def __init__(self, lo, hi, fsiz):
+
+        self.lo = np.asarray(lo, dtype=float)
+        self.hi = np.asarray(hi, dtype=float)
+        self.ndim = len(self.lo)
+        self._fsiz = fsiz
+        self._front = None
+        self.rng = np.random.default_rng()
+
+    def new_params(self):
+        return self.lo + (self.hi - self.lo) * self.rng.random(self.ndim)
+
+    def eval_params(self, x):
+        fitness, steps = self.eval_batch(np.asarray(x)[np.newaxis])
+        return fitness[0], steps[0]
+
+    def eval_batch(self, X):
+        return self.objectives(np.asarray(X, dtype=float)), np.ones(len(X), dtype=int)
+
+    @staticmethod
+    def fitcmp(f1, f2):
+        return f1 < f2
+
+    def mutate(self, x, g, G):
+        x = x + self.rng.standard_normal(self.ndim) * (self.hi - self.lo)/2 * self.PM * (G-g)/G
+        return np.clip(x, self.lo, self.hi)
+
+    def crossover(self, p, q):
+        k = self.rng.integers(self.ndim-1) + 1 if self.ndim > 1 else 1
+        return np.append(p[:k], q[k:])
+
+    def mutate_batch(self, X, g, G):
+        X = X + self.rng.standard_normal(X.shape) * (self.hi - self.lo)/2 * self.PM * (G-g)/G
+        return np.clip(X, self.lo, self.hi)
+
+    def crossover_batch(self, P, Q):
+        k = self.rng.integers(1, self.ndim, len(P)) if self.ndim > 1 else np.ones(len(P), dtype=int)
+        return np.where(np.arange(self.ndim) < k[:,np.newaxis], P, Q)
+
+    def pareto_front(self, n=1000):
+        '''
+        Returns a sample of about n points on the true Pareto front
+        '''
+        return _nondominated(self.objectives(self.optimal_params(n)))
+
+    @property
+    def fmin(self):
+        return tuple(self._front_sample().min(axis=0))
+
+    @property
+    def fmax(self):
+        F = self._front_sample()
+        return tuple(np.maximum(F.max(axis=0), F.min(axis=0) + 1e-6))
+
+    @property
+    def fsiz(self):
+        return self._fsiz
+
+    @property
+    def pc(self):
+        return self.PC
+
+    def _front_sample(self):
+        if self._front is None:
+            self._front = self.pareto_front()
+        return self._front
+
+# ZDT problems -------------------------------------------------------------------------------------
+
+class _ZDT(_Problem):
+
+    def __init__(self, ndim, lo=None, hi=None):
+
+        _Problem.__init__(self, np.zeros(ndim) if lo is None else lo, np.ones(ndim) if hi is None else hi, 2)
+
+    def objectives(self, X):
+        f1 = self.f1(X)
+        g = self.g(X)
+        return np.column_stack((f1, g * self.h(f1, g)))
+
+    def f1(self, X):
+        return X[:,0]
+
+    def g(self, X):
+        return 1 + 9 * np.mean(X[:,1:], axis=1)
+
+    def optimal_params(self, n):
+        X = np.zeros((n, self.ndim))
+        X[:,0] = np.linspace(0, 1, n)
+        return X
+
+class ZDT1(_ZDT):
+
+    def __init__(self, ndim=30):
+        _ZDT.__init__(self, ndim)
+
+    def h(self, f1, g):
+        return 1 - np.sqrt(f1/g)
+
+class ZDT2(_ZDT):
+
+    def __init__(self, ndim=30):
+        _ZDT.__init__(self, ndim)
+
+    def h(self, f1, g):
+        return 1 - (f1/g)**2
+
+class ZDT3(_ZDT):
+
+    def __init__(self, ndim=30):
+        _ZDT.__init__(self, ndim)
+
+    def h(self, f1, g):
+        return 1 - np.sqrt(f1/g) - (f1/g) * np.sin(10*np.pi*f1)
+
+class ZDT4(_ZDT):
+
+    def __init__(self, ndim=10):
+        _ZDT.__init__(self, ndim, np.append(0, -5*np.ones(ndim-1)), np.append(1, 5*np.ones(ndim-1)))
+
+    def g(self, X):
+        return 1 + 10*(self.ndim-1) + np.sum(X[:,1:]**2 - 10*np.cos(4*np.pi*X[:,1:]), axis=1)
+
+    def h(self, f1, g):
+        return 1 - np.sqrt(f1/g)
+
+class ZDT5(_ZDT):
+    '''
+    Binary-coded ZDT5: a 30-bit substring followed by ten 5-bit substrings.  Parameters are arrays
+    of 0s and 1s; mutation flips bits.
+    '''
+
+    def __init__(self, nsub=10):
+        _ZDT.__init__(self, 30 + 5*nsub)
+        self.nsub = nsub
+
+    def new_params(self):
+        return self.rng.integers(2, size=self.ndim)
+
+    def mutate(self, x, g, G):
+        flip = self.rng.random(self.ndim) < self.PM * (G-g)/G
+        return np.where(flip, 1-x, x)
+
+    def mutate_batch(self, X, g, G):
+        flip = self.rng.random(X.shape) < self.PM * (G-g)/G
+        return np.where(flip, 1-X, X)
+
+    def f1(self, X):
+        return 1 + np.sum(X[:,:30], axis=1)
+
+    def g(self, X):
+        u = np.sum(X[:,30:].reshape(len(X), self.nsub, 5), axis=2)
+        return np.sum(np.where(u < 5, 2 + u, 1), axis=1)
+
+    def h(self, f1, g):
+        return 1 / f1
+
+    def optimal_params(self, n):
+        X = np.ones((31, self.ndim), dtype=int)
+        X[:,:30] = np.tril(np.ones((31, 30), dtype=int), -1)
+        return X
+
+class ZDT6(_ZDT):
+
+    def __init__(self, ndim=10):
+        _ZDT.__init__(self, ndim)
+
+    def f1(self, X):
+        return 1 - np.exp(-4*X[:,0]) * np.sin(6*np.pi*X[:,0])**6
+
+    def g(self, X):
+        return 1 + 9 * np.mean(X[:,1:], axis=1)**0.25
+
+    def h(self, f1, g):
+        return 1 - (f1/g)**2
+
+# DTLZ problems ------------------------------------------------------------------------------------
+
+class _DTLZ(_Problem):
+
+    # Value of the distance variables on the Pareto front
+    XOPT = 0.5
+
+    def __init__(self, fsiz, k):
+
+        ndim = fsiz + k - 1
+        _Problem.__init__(self, np.zeros(ndim), np.ones(ndim), fsiz)
+        self.k = k
+
+    def objectives(self, X):
+        M = self.fsiz
+        return self.shape(X[:,:M-1], self.g(X[:,M-1:]))
+
+    def shape(self, Xp, g):
+        return _sphere(Xp * np.pi/2, 1 + g)
+
+    def g(self, Xm):
+        return np.sum((Xm - 0.5)**2, axis=1)
+
+    def optimal_params(self, n):
+        X = self.XOPT * np.ones((n, self.ndim))
+        X[:,:self.fsiz-1] = np.random.RandomState(0).random_sample((n, self.fsiz-1)) # leave global state alone
+        return X
+
+class DTLZ1(_DTLZ):
+
+    def __init__(self, fsiz=3, k=5):
+        _DTLZ.__init__(self, fsiz, k)
+
+    def g(self, Xm):
+        return 100 * (self.k + np.sum((Xm - 0.5)**2 - np.cos(20*np.pi*(Xm - 0.5)), axis=1))
+
+    def shape(self, Xp, g):
+        M = self.fsiz
+        F = np.empty((len(g), M))
+        for i in range(M):
+            F[:,i] = 0.5 * (1 + g) * np.prod(Xp[:,:M-1-i], axis=1)
+            if i > 0:
+                F[:,i] *= 1 - Xp[:,M-1-i]
+        return F
+
+class DTLZ2(_DTLZ):
+
+    def __init__(self, fsiz=3, k=10):
+        _DTLZ.__init__(self, fsiz, k)
+
+class DTLZ3(DTLZ1):
+
+    def __init__(self, fsiz=3, k=10):
+        _DTLZ.__init__(self, fsiz, k)
+
+    shape = _DTLZ.shape
+
+class DTLZ4(_DTLZ):
+
+    ALPHA = 100
+
+    def __init__(self, fsiz=3, k=10):
+        _DTLZ.__init__(self, fsiz, k)
+
+    def shape(self, Xp, g):
+        return _DTLZ.shape(self, Xp**self.ALPHA, g)
+
+    def optimal_params(self, n):
+        X = _DTLZ.optimal_params(self, n)
+        X[:,:self.fsiz-1] **= 1/self.ALPHA # spread points evenly over the front
+        return X
+
+class DTLZ5(_DTLZ):
+
+    def __init__(self, fsiz=3, k=10):
+        _DTLZ.__init__(self, fsiz, k)
+
+    def objectives(self, X):
+        M = self.fsiz
+        g = self.g(X[:,M-1:])
+        theta = np.pi / (4 * (1 + g[:,np.newaxis])) * (1 + 2 * g[:,np.newaxis] * X[:,:M-1])
+        theta[:,0] = X[:,0] * np.pi/2
+        return _sphere(theta, 1 + g)
+
+class DTLZ6(DTLZ5):
+
+    XOPT = 0
+
+    def g(self, Xm):
+        return np.sum(Xm**0.1, axis=1)
+
+class DTLZ7(_DTLZ):
+
+    XOPT = 0
+
+    def __init__(self, fsiz=3, k=20):
+        _DTLZ.__init__(self, fsiz, k)
+
+    def objectives(self, X):
+        M = self.fsiz
+        Fp = X[:,:M-1]
+        g = 1 + 9 * np.mean(X[:,M-1:], axis=1)
+        h = M - np.sum(Fp / (1 + g[:,np.newaxis]) * (1 + np.sin(3*np.pi*Fp)), axis=1)
+        return np.column_stack((Fp, (1 + g) * h))
+
+# Other problems from Deb et al. (2002) ------------------------------------------------------------
+
+class FON(_Problem):
+
+    def __init__(self, ndim=3):
+        _Problem.__init__(self, -4*np.ones(ndim), 4*np.ones(ndim), 2)
+
+    def objectives(self, X):
+        a = 1 / np.sqrt(self.ndim)
+        return np.column_stack((1 - np.exp(-np.sum((X - a)**2, axis=1)), 1 - np.exp(-np.sum((X + a)**2, axis=1))))
+
+    def optimal_params(self, n):
+        a = 1 / np.sqrt(self.ndim)
+        return np.linspace(-a, a, n)[:,np.newaxis] * np.ones(self.ndim)
+
+class POL(_Problem):
+
+    A1 = 0.5*np.sin(1) - 2*np.cos(1) + np.sin(2) - 1.5*np.cos(2)
+    A2 = 1.5*np.sin(1) - np.cos(1) + 2*np.sin(2) - 0.5*np.cos(2)
+
+    def __init__(self):
+        _Problem.__init__(self, -np.pi*np.ones(2), np.pi*np.ones(2), 2)
+
+    def objectives(self, X):
+        x1, x2 = X[:,0], X[:,1]
+        B1 = 0.5*np.sin(x1) - 2*np.cos(x1) + np.sin(x2) - 1.5*np.cos(x2)
+        B2 = 1.5*np.sin(x1) - np.cos(x1) + 2*np.sin(x2) - 0.5*np.cos(x2)
+        return np.column_stack((1 + (self.A1 - B1)**2 + (self.A2 - B2)**2, (x1 + 3)**2 + (x2 + 1)**2))
+
+    def optimal_params(self, n):
+        # No closed form: sample the decision space densely and let pareto_front() filter it
+        x = np.linspace(-np.pi, np.pi, int(np.sqrt(100*n)))
+        return np.array(np.meshgrid(x, x)).reshape(2, -1).T
+
+# Problems by name, for benchmark drivers
+PROBLEMS = {cls.__name__ : cls for cls in (ZDT1, ZDT2, ZDT3, ZDT4, ZDT5, ZDT6,
+    DTLZ1, DTLZ2, DTLZ3, DTLZ4, DTLZ5, DTLZ6, DTLZ7, FON, POL)}
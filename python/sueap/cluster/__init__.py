@@ -0,0 +1,257 @@
+'''
+Distributed fitness evaluation over TCP: a coordinator that hands out chunks of the population to
+worker processes on other machines, each started with the sueap-worker command
+
+Copyright (C) 2020 Simon D. Levy
+
+MIT License
+'''
+
+import os
+import sys
+import time
+import queue
+import runpy
+import argparse
+import threading
+from multiprocessing.connection import Listener, Client
+import numpy as np
+from sueap.algorithms import EvaluationPool, _WorkerToMainItem
+
+class Coordinator(EvaluationPool):
+    '''
+    An EvaluationPool whose workers are remote processes that connect to it over TCP, so that it can
+    be passed as the pool of any algorithm:
+
+        with Coordinator(problem, ('', 6000), b'secret', workers_count=16) as pool:
+            NSGA2(problem, 400, pool=pool).run(100, reporter)
+
+    with workers on each machine started by
+
+        sueap-worker coordinator-host:6000 --authkey secret
+
+    Work handed to a worker that disconnects is put back in the queue for the other workers, and new
+    workers may join at any time.  Both ends unpickle what the other sends, so the authkey is all
+    that stops anyone who can reach the port from running code on them; there is no default, and it
+    should be kept secret.
+    '''
+
+    def __init__(self, problem, address, authkey, workers_count=1, chunk_size=None):
+        '''
+        Inputs:
+            problem       problem object, sent to each worker when it connects; its class must be
+                          importable by the workers (see sueap-worker --script)
+            address       (host, port) to listen on; use host '' to accept workers from other machines,
+                          and port 0 to pick a free port, which is then available as self.address
+            authkey       secret bytes shared with the workers for authenticating connections
+            workers_count maximum number of workers served at once; further workers are turned away
+            chunk_size    as for EvaluationPool
+        '''
+
+        if not isinstance(authkey, bytes) or len(authkey) == 0:
+            raise ValueError('authkey must be a non-empty bytes object')
+
+        EvaluationPool.__init__(self, problem, workers_count, False, chunk_size)
+
+        self.address = address
+        self.authkey = authkey
+
+        self.listener = None
+        self.accepter = None
+
+        # Connection-serving thread for each worker slot, or None if the slot is free
+        self.slots = [None] * self.workers_count
+        self.slots_lock = threading.Lock()
+
+        # Number of tasks handed back to the queue after their worker disconnected
+        self.requeued = 0
+
+    @property
+    def running(self):
+
+        return self.listener is not None
+
+    def start(self):
+        '''
+        Starts listening for workers.  Evaluation begins as soon as the first worker connects.
+        Returns: this coordinator
+        '''
+
+        # Handler threads take tasks from one queue and put results on the other
+        self.main_to_worker_queue = queue.Queue()
+        self.worker_to_main_queue = queue.Queue()
+
+        self.listener = Listener(self.address, authkey=self.authkey)
+        self.address = self.listener.address
+
+        self.accepter = threading.Thread(target=self._accept)
+        self.accepter.daemon = True
+        self.accepter.start()
+
+        return self
+
+    def stop(self):
+        '''
+        Tells each connected worker to stop, collecting the reports from their problems' close()
+        methods, and stops listening.
+        '''
+
+        if not self.running:
+            return
+
+        listener = self.listener
+        self.listener = None
+
+        # Wake the accepting thread with a connection of our own, so it sees that we're stopping
+        Client(self.address, authkey=self.authkey).close()
+        self.accepter.join()
+        listener.close()
+
+        with self.slots_lock:
+            handlers = [handler for handler in self.slots if handler is not None]
+
+        for _ in handlers:
+            self.main_to_worker_queue.put(None) # handlers stop on None
+
+        for handler in handlers:
+            handler.join()
+
+    @property
+    def connected(self):
+        '''
+        Number of workers currently connected
+        '''
+
+        with self.slots_lock:
+            return sum(handler is not None for handler in self.slots)
+
+    def _accept(self):
+
+        while True:
+
+            conn = self.listener.accept() if self.listener is not None else None
+
+            if self.listener is None:
+                if conn is not None:
+                    conn.close()
+                break
+
+            with self.slots_lock:
+                free = [k for k, handler in enumerate(self.slots) if handler is None]
+                if len(free) == 0:
+                    conn.close()
+                    continue
+                handler = threading.Thread(target=self._serve, args=(conn, free[0]))
+                handler.daemon = True
+                self.slots[free[0]] = handler
+
+            handler.start()
+
+    def _serve(self, conn, slot):
+
+        task = None
+
+        try:
+
+            conn.send(self.problem)
+
+            while True:
+
+                task = self.main_to_worker_queue.get()
+
+                if task is None:
+                    conn.send(None)
+                    self.worker_reports[slot] = conn.recv()
+                    break
+
+                conn.send(task)
+                item = conn.recv()
+                self.worker_to_main_queue.put(item._replace(worker_id=slot))
+                task = None
+
+        except (EOFError, OSError):
+
+            # Hand the lost worker's unfinished task to another worker
+            if task is not None:
+                self.main_to_worker_queue.put(task)
+                self.requeued += 1
+
+        finally:
+
+            conn.close()
+            with self.slots_lock:
+                self.slots[slot] = None
+
+def _parse_address(text):
+
+    host, port = text.rsplit(':', 1)
+    return host, int(port)
+
+def _connect(address, authkey, retry):
+
+    t_start = time.time()
+    while True:
+        try:
+            return Client(address, authkey=authkey)
+        except ConnectionRefusedError:
+            if time.time() - t_start > retry:
+                raise
+            time.sleep(0.5)
+
+def worker_main(argv=None):
+    '''
+    Entry point for the sueap-worker command: connects to a Coordinator and evaluates the chunks of
+    the population that it sends, until told to stop
+    '''
+
+    parser = argparse.ArgumentParser(description='Evaluate fitnesses for a SUEAP Coordinator')
+    parser.add_argument('address', help='coordinator address, as HOST:PORT')
+    parser.add_argument('--authkey', default=os.environ.get('SUEAP_AUTHKEY'),
+            help='key shared with the coordinator; defaults to the SUEAP_AUTHKEY environment variable')
+    parser.add_argument('--workers', type=int, default=1, help='number of local processes to evaluate with')
+    parser.add_argument('--script', default=None,
+            help='Python script defining the problem class, when that class is defined in the coordinator\'s main script')
+    parser.add_argument('--retry', type=float, default=30, help='seconds to keep trying to connect')
+    args = parser.parse_args(argv)
+
+    if not args.authkey:
+        parser.error('an authkey is required, from --authkey or the SUEAP_AUTHKEY environment variable')
+
+    # Make the script's definitions visible to unpickling as if they were in our own main module
+    if args.script is not None:
+        sys.modules['__main__'].__dict__.update(runpy.run_path(args.script, run_name='__sueap_worker__'))
+
+    conn = _connect(_parse_address(args.address), args.authkey.encode(), args.retry)
+
+    try:
+        problem = conn.recv()
+    except EOFError:
+        print('Coordinator at %s has all the workers it needs' % args.address)
+        return
+
+    # Evaluate in this process, or share the work among several local processes
+    pool = EvaluationPool(problem, workers_count=(args.workers if args.workers > 1 else 0)).start()
+
+    while True:
+
+        task = conn.recv()
+        if task is None:
+            break
+
+        # Give the chunk's members the same random streams they would have had on the coordinator
+        seed = None
+        if task.seed is not None:
+            entropy, spawn_key, first = task.seed
+            seed = np.random.SeedSequence(entropy, spawn_key=spawn_key, n_children_spawned=first+task.offset)
+
+        t_start = time.time()
+        population, steps = pool.evaluate(task.params, threshold=task.threshold, seed=seed)
+
+        conn.send(_WorkerToMainItem(count=len(population), params=[p for p,_ in population],
+            fitness=[f for _,f in population], steps=[steps], busy=time.time()-t_start, task_id=task.task_id,
+            offset=task.offset))
+
+    pool.stop()
+
+    conn.send(pool.worker_reports)
+    conn.close()
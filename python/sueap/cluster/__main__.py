@@ -0,0 +1,11 @@
+'''
+Runs a worker for a SUEAP Coordinator: python3 -m sueap.cluster HOST:PORT
+
+Copyright (C) 2020 Simon D. Levy
+
+MIT License
+'''
+
+from sueap.cluster import worker_main
+
+worker_main()
@@ -6,50 +6,168 @@ Copyright (C) 2020 Simon D. Levy
 MIT License
 '''
 
+import os
+import time
 import gym
 import numpy as np
 
+# Each process keeps its own idle environments, created on first use and re-used for later episodes
+_envs = {}
+_envs_pid = None
+_env_stats = {'constructed':0, 'reused':0, 'construct_time':0.}
+
+def _acquire_env(env_name):
+    '''
+    Returns an idle environment for env_name, making one if there isn't one
+    '''
+
+    global _envs_pid
+
+    # A forked worker must not share its parent's environments
+    if _envs_pid != os.getpid():
+        _envs.clear()
+        _env_stats.update(constructed=0, reused=0, construct_time=0.)
+        _envs_pid = os.getpid()
+
+    idle = _envs.setdefault(env_name, [])
+    if len(idle) > 0:
+        _env_stats['reused'] += 1
+        return idle.pop()
+
+    t_start = time.time()
+    env = gym.make(env_name)
+    _env_stats['constructed'] += 1
+    _env_stats['construct_time'] += time.time() - t_start
+
+    return env
+
+def _release_env(env_name, env):
+
+    _envs[env_name].append(env)
+
+def env_stats():
+    '''
+    Returns a dictionary of this process's environment-pool counters: the number of environments
+    constructed and re-used, the time spent constructing them, and the estimated construction time
+    saved by re-use
+    '''
+
+    stats = dict(_env_stats)
+    constructed = stats['constructed']
+    stats['saved_time'] = stats['reused'] * stats['construct_time'] / constructed if constructed > 0 else 0.
+    return stats
+
+def close_envs():
+    '''
+    Closes this process's idle environments.
+    Returns: the environment-pool counters from env_stats()
+    '''
+
+    stats = env_stats()
+
+    if _envs_pid == os.getpid():
+        for idle in _envs.values():
+            for env in idle:
+                env.close()
+    _envs.clear()
+
+    return stats
+
 class _Problem:
 
-    def __init__(self, env_name, ndims, seed=None):
+    def __init__(self, env_name, seed=None, vectorized=False):
 
-        # Seed random-number generator if indicated
-        if seed is not None:
-            np.random.seed(seed)
+        # Random-number generator, replaced by the GA's own streams during a run
+        self.rng = np.random.default_rng(seed)
 
         # Get observation space and action space sizes from environment
-        env = gym.make(env_name)
+        env = _acquire_env(env_name)
         self.obs_size = env.observation_space.shape[0]
         self.act_size = env.action_space.shape[0] if hasattr(env.action_space, 'high') else 1
+        _release_env(env_name, env)
 
         self.seed = seed
         self.env_name = env_name
+        self.vectorized = vectorized
 
     def eval_params(self, params, episodes=10):
 
         total_reward = self.initial_reward()
         total_steps = 0
 
-        for _ in range(episodes):
+        results = self.run_episodes(params, episodes) if self.vectorized else (
+                self.run_episode(params) for _ in range(episodes))
 
-            episode_reward, episode_steps = self.run_episode(params)
+        for episode_reward, episode_steps in results:
 
             total_reward += episode_reward
             total_steps += episode_steps
 
         return total_reward, total_steps
 
+    def get_actions(self, params, observations):
+        '''
+        Returns a list of actions, one for each row of the observations matrix.  Override this
+        to compute the actions for vectorized rollouts in a single batched forward pass.
+        '''
+
+        return [self.get_action(params, obs) for obs in observations]
+
+    def run_episodes(self, params, episodes):
+        '''
+        Runs several episodes in lock-step on a batch of environments, getting each step's actions
+        for all unfinished episodes with one call to get_actions().
+        Returns: a list of (reward, steps) pairs, one per episode
+        '''
+
+        rewards = [self.initial_reward() for _ in range(episodes)]
+        steps = [0] * episodes
+
+        # Get envs from this process's pool, reseeding them for the new episodes
+        envs = [_acquire_env(self.env_name) for _ in range(episodes)]
+
+        for env in envs:
+            self._seed_env(env)
+
+        obs = [env.reset() for env in envs]
+
+        # Simulation loop, masking out finished episodes
+        active = np.ones(episodes, dtype=bool)
+        while np.any(active):
+
+            running = np.flatnonzero(active)
+
+            actions = self.get_actions(params, np.array([obs[k] for k in running]))
+
+            for k, action in zip(running, actions):
+
+                # Do environment step
+                obs[k], reward, done, _ = self.step(envs[k], action)
+
+                # Accumualte reward
+                rewards[k] += reward
+                steps[k] += 1
+
+                # Episode end
+                if done:
+                    active[k] = False
+
+        # Return envs to pool
+        for env in envs:
+            _release_env(self.env_name, env)
+
+        return list(zip(rewards, steps))
+
     def run_episode(self, params, render=False):
 
 
         episode_reward = self.initial_reward()
         episode_steps = 0
 
-        # Build env
-        env = gym.make(self.env_name)
+        # Get an env from this process's pool, reseeding it for the new episode
+        env = _acquire_env(self.env_name)
 
-        if self.seed is not None:
-            env.seed(self.seed)
+        self._seed_env(env)
 
         obs = env.reset()
 
@@ -73,19 +191,37 @@ class _Problem:
             if done:
                 break
 
-        # Cleanup
-        env.close()
+        # Return env to pool
+        _release_env(self.env_name, env)
 
         return episode_reward, episode_steps
 
+    def _seed_env(self, env):
+
+        # With a fixed seed every episode is the same; otherwise each episode's seed comes from our stream
+        env.seed(self.seed if self.seed is not None else int(self.rng.integers(2**31)))
+
+    def close(self):
+        '''
+        Closes this process's pooled environments; called by each worker when it shuts down.
+        Returns: the environment-pool counters from env_stats()
+        '''
+
+        return close_envs()
+
 class MultiobjectiveProblem(_Problem):
 
-    def __init__(self, env_name, ndims, seed=None):
+    def __init__(self, env_name, ndims, seed=None, vectorized=False):
 
-        _Problem.__init__(self, env_name, seed)
+        _Problem.__init__(self, env_name, seed, vectorized)
 
         self.ndims = ndims
 
+    @property
+    def fsiz(self):
+
+        return self.ndims
+
     def initial_reward(self):
 
         return np.zeros(self.ndims)
@@ -96,13 +232,44 @@ class MultiobjectiveProblem(_Problem):
 
 class Problem(_Problem):
 
-    def __init__(self, env_name, seed=None):
+    def __init__(self, env_name, seed=None, vectorized=False):
 
-        _Problem.__init__(self, env_name, seed)
+        _Problem.__init__(self, env_name, seed, vectorized)
 
     def initial_reward(self):
 
         return 0
+
+    def eval_race(self, params, threshold, episodes=10, first=2, z=1.0):
+        '''
+        Like eval_params(), but runs the episodes in rungs of doubling size, stopping early once an optimistic
+        projection of the total reward over all episodes (mean plus z standard errors) falls below threshold.
+        Returns: total reward (projected from the episodes run, if stopped early) and total steps
+        '''
+
+        rewards = []
+        total_steps = 0
+
+        n = min(first, episodes)
+
+        while True:
+
+            results = self.run_episodes(params, n-len(rewards)) if self.vectorized else (
+                    [self.run_episode(params) for _ in range(n-len(rewards))])
+
+            for episode_reward, episode_steps in results:
+                rewards.append(episode_reward)
+                total_steps += episode_steps
+
+            if len(rewards) == episodes:
+                return self.initial_reward() + sum(rewards), total_steps
+
+            # Quit this individual if it can't plausibly reach the threshold
+            sem = np.std(rewards, ddof=1) / np.sqrt(len(rewards)) if len(rewards) > 1 else 0
+            if episodes * (np.mean(rewards) + z * sem) < threshold:
+                return episodes * np.mean(rewards), total_steps
+
+            n = min(2*n, episodes)
     
     def step(self, env, action):
 
@@ -0,0 +1,222 @@
+'''
+Quality indicators for monitoring the convergence of a Pareto front: hypervolume, inverted
+generational distance (IGD), and spread.  Each takes an N x fsiz matrix of fitnesses, usually the
+first front of an NSGA-II population (P.f[P.rank==1]), with every objective minimized; negate any
+objectives that your problem maximizes.
+
+Copyright (C) 2020 Simon D. Levy
+
+MIT License
+'''
+
+import bisect
+import numpy as np
+
+# Largest number of objectives for which hypervolume() is computed exactly by default
+_MAX_EXACT_OBJECTIVES = 4
+
+# Default number of Monte-Carlo samples for hypervolume() on more objectives
+_SAMPLES = 100000
+
+# Maximum number of elements in a temporary array; bounds memory for large fronts
+_BLOCK_SIZE = 1 << 22
+
+def _nondominated(F):
+    '''
+    Returns the distinct rows of F that are not dominated by any other row
+    '''
+
+    F = np.unique(F, axis=0)
+
+    # Two objectives: a sweep in order of the first objective
+    if F.shape[1] == 2:
+        F = F[np.lexsort((F[:,1], F[:,0]))]
+        best = np.minimum.accumulate(F[:,1])
+        keep = np.ones(len(F), dtype=bool)
+        keep[1:] = F[1:,1] < best[:-1]
+        return F[keep]
+
+    dominated = np.zeros(len(F), dtype=bool)
+    for f in F:
+        dominated |= np.all(f <= F, axis=1) & np.any(f < F, axis=1)
+
+    return F[~dominated]
+
+def _hv2(F, ref):
+    '''
+    Exact two-objective hypervolume by a sweep along the first objective
+    '''
+
+    F = F[np.argsort(F[:,0], kind='stable')]
+    f2 = np.minimum.accumulate(F[:,1])
+    widths = np.diff(np.append(F[:,0], ref[0]))
+    return np.sum(widths * (ref[1] - f2))
+
+def _hv3(F, ref):
+    '''
+    Exact three-objective hypervolume by a sweep along the third objective, keeping a sorted 2D
+    skyline of the points seen so far and summing the area of each slab
+    '''
+
+    F = F[np.argsort(F[:,2], kind='stable')]
+    slabs = np.diff(np.append(F[:,2], ref[2]))
+
+    xs, ys = [], []     # skyline: xs ascending, ys descending
+    total = 0.
+
+    for (x, y, _), depth in zip(F, slabs):
+
+        i = bisect.bisect_left(xs, x)
+
+        # Skip a point that's dominated in the first two objectives
+        if not ((i > 0 and ys[i-1] <= y) or (i < len(xs) and xs[i] == x and ys[i] <= y)):
+
+            # Remove the points that the new one dominates, which follow it in the skyline
+            j = i
+            while j < len(ys) and ys[j] >= y:
+                j += 1
+            xs[i:j] = [x]
+            ys[i:j] = [y]
+
+        if depth > 0:
+            total += depth * np.sum(np.diff(np.append(xs, ref[0])) * (ref[1] - np.array(ys)))
+
+    return total
+
+def _wfg(F, ref):
+    '''
+    Exact hypervolume from While, Bradstreet and Barone (2012): the sum of each point's exclusive
+    contribution with respect to the points after it, computed recursively on the limited sets
+    '''
+
+    if len(F) == 0:
+        return 0.
+
+    if F.shape[1] == 2:
+        return _hv2(F, ref)
+
+    if F.shape[1] == 3:
+        return _hv3(F, ref)
+
+    F = F[np.argsort(-F[:,-1], kind='stable')]
+
+    total = 0.
+    for k in range(len(F)):
+        total += np.prod(ref - F[k])
+        if k < len(F) - 1:
+            total -= _wfg(_nondominated(np.maximum(F[k+1:], F[k])), ref)
+
+    return total
+
+def _monte_carlo(F, ref, samples, rng):
+    '''
+    Estimates hypervolume as the fraction of random points in the bounding box that F dominates
+    '''
+
+    lo = np.min(F, axis=0)
+
+    block = max(1, _BLOCK_SIZE // (len(F) * F.shape[1]))
+    hits = 0
+    for start in range(0, samples, block):
+        Z = lo + (ref - lo) * rng.random((min(block, samples-start), F.shape[1]))
+        hits += np.sum(np.any(np.all(Z[:,np.newaxis,:] >= F[np.newaxis,:,:], axis=2), axis=1))
+
+    return np.prod(ref - lo) * hits / samples
+
+def hypervolume(F, ref, samples=None, rng=None):
+    '''
+    Computes the volume of objective space dominated by F and bounded by a reference point.
+    Inputs:
+        F        N x fsiz matrix of fitnesses
+        ref      reference point, worse than the front in every objective; points not strictly
+                 better than it contribute nothing
+        samples  number of Monte-Carlo samples, or None to compute the volume exactly on up to
+                 four objectives and estimate it with 100,000 samples on more
+        rng      optional np.random.Generator for the Monte-Carlo samples; by default a fixed
+                 seed is used, so that successive estimates are comparable and the global random
+                 state is untouched
+    Returns: hypervolume
+    '''
+
+    F = np.asarray(F, dtype=float)
+    ref = np.asarray(ref, dtype=float)
+
+    F = F[np.all(F < ref, axis=1)]
+    if len(F) == 0:
+        return 0.
+
+    if F.shape[1] == 1:
+        return float(ref[0] - np.min(F))
+
+    if samples is None and F.shape[1] <= _MAX_EXACT_OBJECTIVES:
+        return float(_wfg(_nondominated(F), ref))
+
+    return float(_monte_carlo(F, ref, _SAMPLES if samples is None else samples,
+        np.random.default_rng(0) if rng is None else rng))
+
+def igd(F, Z):
+    '''
+    Computes the inverted generational distance from a front to a reference set.
+    Inputs:
+        F  N x fsiz matrix of fitnesses
+        Z  M x fsiz matrix of points sampled from the true Pareto front (for example,
+           the pareto_front() of a problem from sueap.benchmarks)
+    Returns: the mean distance from each point in Z to its nearest point in F, or infinity if F is
+             empty
+    '''
+
+    F = np.asarray(F, dtype=float)
+    Z = np.asarray(Z, dtype=float)
+
+    if len(F) == 0:
+        return np.inf
+
+    ff = np.sum(F**2, axis=1)
+
+    block = max(1, _BLOCK_SIZE // len(F))
+    nearest = np.empty(len(Z))
+    for start in range(0, len(Z), block):
+        z = Z[start:start+block]
+        d2 = np.sum(z**2, axis=1)[:,np.newaxis] + ff[np.newaxis,:] - 2 * z.dot(F.T)
+        nearest[start:start+block] = np.sqrt(np.maximum(np.min(d2, axis=1), 0))
+
+    return float(np.mean(nearest))
+
+def spread(F, Z=None):
+    '''
+    Computes the spread (diversity) of a front: zero for evenly spaced points that reach the ends
+    of the true front, larger for clumped or truncated fronts.  For two objectives this is
+    Deb et al.'s (2002) Delta, computed on the points in order along the front; for more it is the
+    generalization of Zhou et al. (2006), using each point's distance to its nearest neighbor.
+    Inputs:
+        F  N x fsiz matrix of fitnesses
+        Z  optional M x fsiz matrix of points sampled from the true Pareto front, whose best point
+           in each objective is taken as an extreme point; if omitted, distances to the extremes
+           are left out
+    Returns: spread
+    '''
+
+    F = _nondominated(np.asarray(F, dtype=float))
+
+    if len(F) < 2:
+        return 1.
+
+    if F.shape[1] == 2:
+        F = F[np.argsort(F[:,0])]
+        d = np.linalg.norm(np.diff(F, axis=0), axis=1)
+    else:
+        D = np.linalg.norm(F[:,np.newaxis,:] - F[np.newaxis,:,:], axis=2)
+        np.fill_diagonal(D, np.inf)
+        d = np.min(D, axis=1)
+
+    dbar = np.mean(d)
+
+    de = 0.
+    if Z is not None:
+        Z = np.asarray(Z, dtype=float)
+        extremes = Z[np.argmin(Z, axis=0)]
+        de = np.sum(np.min(np.linalg.norm(extremes[:,np.newaxis,:] - F[np.newaxis,:,:], axis=2), axis=1))
+
+    denominator = de + len(d) * dbar
+
+    return float((de + np.sum(np.abs(d - dbar))) / denominator) if denominator > 0 else 0.
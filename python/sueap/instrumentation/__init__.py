@@ -0,0 +1,228 @@
+'''
+Per-generation performance instrumentation for SUEAP algorithms
+
+Copyright (C) 2020 Simon D. Levy
+
+MIT License
+'''
+
+import csv
+import json
+import time
+import cProfile
+import contextlib
+import numpy as np
+
+# Phases timed in each generation; algorithms leave a phase at zero if they don't have it
+PHASES = ('evaluation', 'transfer', 'sorting', 'crowding', 'selection', 'variation', 'archive', 'screening')
+
+class Instruments:
+    '''
+    Collects timings for each generation and passes them to a list of sinks.  Each generation's
+    record is a dictionary with the generation index; its total time; the time spent in each of the
+    PHASES, where evaluation includes the time spent sending work to the workers (transfer); the
+    number of evaluations and evaluations per second; and, when an EvaluationPool is
+    attached, each worker's busy and idle time during evaluation.
+    '''
+
+    def __init__(self, sinks):
+        '''
+        Inputs:
+            sinks  list of objects providing a record(stats) method, and optionally begin(generation)
+                   and close() methods
+        '''
+
+        self.sinks = sinks
+        self.pool = None
+
+        self.stats = None
+        self.t_start = None
+        self.pool_start = None
+
+    def attach(self, pool):
+        '''
+        Sets the EvaluationPool whose counters are reported
+        '''
+
+        self.pool = pool
+
+    def begin_generation(self, generation):
+
+        self.stats = {'generation':generation}
+        self.stats.update({phase:0. for phase in PHASES})
+
+        self.pool_start = self._pool_counters()
+
+        for sink in self.sinks:
+            if hasattr(sink, 'begin'):
+                sink.begin(generation)
+
+        self.t_start = time.time()
+
+    @contextlib.contextmanager
+    def timer(self, phase):
+        '''
+        Context manager that adds the time spent in its block to phase
+        '''
+
+        t_start = time.time()
+        yield
+        if self.stats is not None:
+            self.stats[phase] = self.stats.get(phase, 0.) + time.time() - t_start
+
+    def end_generation(self, **extra):
+        '''
+        Finishes the current generation's record, adding any extra values, and sends it to the sinks
+        '''
+
+        stats = self.stats
+        stats['time'] = time.time() - self.t_start
+
+        if self.pool is not None:
+            busy, evals, eval_time, dispatch_time = [now - then for now, then in
+                    zip(self._pool_counters(), self.pool_start)]
+            stats['transfer'] += dispatch_time
+            stats['evals'] = int(np.sum(evals))
+            stats['evals_per_sec'] = stats['evals'] / eval_time if eval_time > 0 else 0.
+            stats['worker_busy'] = busy.tolist()
+            stats['worker_idle'] = (eval_time - busy).tolist()
+
+        stats.update(extra)
+
+        for sink in self.sinks:
+            sink.record(stats)
+
+        self.stats = None
+
+    def close(self):
+        '''
+        Closes the sinks at the end of a run, finishing any profile still running
+        '''
+
+        for sink in self.sinks:
+            if hasattr(sink, 'close'):
+                sink.close()
+
+    def _pool_counters(self):
+
+        if self.pool is None:
+            return None
+
+        return (self.pool.worker_busy.copy(), self.pool.worker_evals.copy(), self.pool.eval_time,
+                self.pool.dispatch_time)
+
+class CallbackSink:
+    '''
+    Calls a function with each generation's record
+    '''
+
+    def __init__(self, callback):
+
+        self.callback = callback
+
+    def record(self, stats):
+
+        self.callback(stats)
+
+class JSONLSink:
+    '''
+    Appends each generation's record to a file as a line of JSON.  The file is closed at the end of
+    each run and reopened by the next.
+    '''
+
+    def __init__(self, filename):
+
+        self.filename = filename
+        self.file = open(filename, 'a')
+
+    def record(self, stats):
+
+        if self.file is None:
+            self.file = open(self.filename, 'a')
+
+        self.file.write(json.dumps(stats) + '\n')
+        self.file.flush()
+
+    def close(self):
+
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+class CSVSink:
+    '''
+    Writes each generation's scalar values as a row of a CSV file; per-worker lists are summarized
+    by their mean.  The file is closed at the end of each run, and later runs append rows to it.
+    '''
+
+    def __init__(self, filename):
+
+        self.filename = filename
+        self.file = open(filename, 'w', newline='')
+        self.fieldnames = None
+        self.writer = None
+
+    def record(self, stats):
+
+        row = {key : (np.mean(value) if isinstance(value, list) else value) for key, value in stats.items()}
+
+        if self.file is None:
+            self.file = open(self.filename, 'a', newline='')
+
+        if self.writer is None:
+            header = self.fieldnames is None
+            if header:
+                self.fieldnames = list(row.keys())
+            self.writer = csv.DictWriter(self.file, fieldnames=self.fieldnames, extrasaction='ignore')
+            if header:
+                self.writer.writeheader()
+
+        self.writer.writerow(row)
+        self.file.flush()
+
+    def close(self):
+
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+            self.writer = None
+
+class ProfileSink:
+    '''
+    Runs cProfile over a range of generations, saving the stats for use with the pstats module
+    '''
+
+    def __init__(self, filename, generations=1, start=0):
+        '''
+        Inputs:
+            filename     name of file for profile stats
+            generations  number of generations to profile
+            start        index of first generation to profile
+        '''
+
+        self.filename = filename
+        self.first = start
+        self.last = start + generations - 1
+        self.profiler = None
+
+    def begin(self, generation):
+
+        if generation == self.first:
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+
+    def record(self, stats):
+
+        if self.profiler is not None and stats['generation'] == self.last:
+            self._finish()
+
+    def close(self):
+
+        if self.profiler is not None:
+            self._finish()
+
+    def _finish(self):
+
+        self.profiler.disable()
+        self.profiler.dump_stats(self.filename)
+        self.profiler = None
@@ -0,0 +1,275 @@
+'''
+Streaming generation logs for post-hoc analysis of long runs.  RunLog appends each generation's
+fitnesses, ranks, parameters and timing to a directory of chunk files, holding no more than one
+chunk of generations in memory; RunLogReader opens the chunks only when they are asked for.
+
+    with RunLog('run1') as log:
+        NSGA2(problem, 400, log=log).run(10000, reporter)
+
+    log = RunLogReader('run1')
+    F = log.fitness(5000)
+
+Copyright (C) 2020 Simon D. Levy
+
+MIT License
+'''
+
+import os
+import re
+import threading
+import numpy as np
+
+# Fields with rows for each individual, and the fields giving the index of each generation's first row
+_ROW_FIELDS = {'fitness':'offsets', 'rank':'offsets', 'params':'params_offsets', 'params_rows':'params_offsets'}
+
+# Uncompressed chunks are written one .npy file per field, with the generation field last, so that a chunk
+# is complete once its generation file exists
+_CHUNK = re.compile(r'(\d+)\.(?:npz|generation\.npy)$')
+
+def _chunk_numbers(path):
+
+    return sorted(int(m.group(1)) for m in map(_CHUNK.search, os.listdir(path)) if m is not None)
+
+def _save(filename, data, compress):
+
+    # Write under a temporary name, so that readers never see a partial file
+    tmp = filename + '.tmp'
+    with open(tmp, 'wb') as f:
+        if compress:
+            np.savez_compressed(f, **data)
+        else:
+            np.save(f, data)
+    os.replace(tmp, filename)
+
+class RunLog:
+    '''
+    Writes a log of a run, one chunk of generations at a time, to a directory.  Chunks are written on
+    a background thread, and only ever added, so a log can be read while the run goes on, and a
+    resumed run can keep writing to the log of the run it resumes.
+    '''
+
+    def __init__(self, path, chunk_size=100, compress=True, params_count=None, params_every=1):
+        '''
+        Inputs:
+            path         directory for the chunk files, created if need be
+            chunk_size   number of generations held in memory and written to each chunk
+            compress     write each chunk as a compressed .npz file; otherwise write a .npy file for
+                         each field, which RunLogReader memory-maps instead of loading
+            params_count number of each generation's individuals whose params are logged, best
+                         ranked first; default None logs them all, and 0 none
+            params_every log params only for every params_every-th generation
+        '''
+
+        self.path = path
+        self.chunk_size = chunk_size
+        self.compress = compress
+        self.params_count = params_count
+        self.params_every = params_every
+
+        os.makedirs(path, exist_ok=True)
+
+        # Carry on after any chunks already there
+        numbers = _chunk_numbers(path)
+        self.next_chunk = numbers[-1] + 1 if numbers else 0
+
+        self.buffer = []
+        self.thread = None
+
+    def __enter__(self):
+
+        return self
+
+    def __exit__(self, *_):
+
+        self.close()
+
+    def record(self, generation, fitness, rank=None, params=None, seconds=None):
+        '''
+        Adds a generation to the log.
+        Inputs:
+            generation index of the generation
+            fitness    N x fsiz matrix, or vector of N scalars, of the population's fitnesses
+            rank       optional vector of N ranks (1 best); by default, the population's order
+            params     optional N x ndim matrix of the population's params
+            seconds    optional time taken by the generation
+        '''
+
+        fitness = np.array(fitness, dtype=float)
+        rank = np.arange(1, len(fitness)+1) if rank is None else np.array(rank)
+
+        rows = np.zeros(0, dtype=int)
+        if params is not None and self.params_count != 0 and generation % self.params_every == 0:
+            rows = np.argsort(rank, kind='stable')[:self.params_count]
+            params = np.array([params[k] for k in rows])
+        else:
+            params = None
+
+        self.buffer.append((generation, np.nan if seconds is None else seconds, fitness, rank, rows, params))
+
+        if len(self.buffer) >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        '''
+        Starts writing the generations recorded since the last chunk as a new chunk
+        '''
+
+        if len(self.buffer) == 0:
+            return
+
+        self.wait()
+
+        self.thread = threading.Thread(target=self._write, args=(self.next_chunk, self.buffer))
+        self.thread.start()
+
+        self.next_chunk += 1
+        self.buffer = []
+
+    def wait(self):
+        '''
+        Waits for the chunk being written, if any, to be finished
+        '''
+
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def close(self):
+        '''
+        Writes any generations not yet written and waits for them to be finished
+        '''
+
+        self.flush()
+        self.wait()
+
+    def _write(self, number, buffer):
+
+        generations, seconds, fitnesses, ranks, rows, params = zip(*buffer)
+
+        arrays = {'generation'     : np.array(generations),
+                  'time'           : np.array(seconds),
+                  'offsets'        : np.cumsum([0] + [len(f) for f in fitnesses]),
+                  'fitness'        : np.concatenate(fitnesses),
+                  'rank'           : np.concatenate(ranks),
+                  'params_offsets' : np.cumsum([0] + [len(r) for r in rows]),
+                  'params_rows'    : np.concatenate(rows)}
+
+        present = [p for p in params if p is not None]
+        if len(present) > 0:
+            arrays['params'] = np.concatenate(present)
+
+        name = os.path.join(self.path, '%06d' % number)
+
+        if self.compress:
+            _save(name + '.npz', arrays, True)
+            return
+
+        for field in sorted(arrays, key=lambda field: field == 'generation'):
+            _save('%s.%s.npy' % (name, field), arrays[field], False)
+
+class RunLogReader:
+    '''
+    Reads a log written by RunLog.  Only the generation numbers and times are read up front; the
+    other fields of a chunk are read when one of its generations is asked for, memory-mapping
+    uncompressed chunks and keeping the most recently used compressed chunk in memory.  If a
+    generation was logged more than once (as by a resumed run), the last record of it is used.
+    '''
+
+    def __init__(self, path):
+        '''
+        Inputs:
+            path  directory written by RunLog
+        '''
+
+        self.path = path
+
+        # Most recently used compressed chunk's number and fields
+        self.cached = None
+
+        # Chunk and position within it of each generation's latest record, and the generation's time
+        self.index = {}
+        self.seconds = {}
+
+        for number in _chunk_numbers(path):
+            generations = self._field(number, 'generation', False)
+            seconds = self._field(number, 'time', False)
+            for k, (g, t) in enumerate(zip(generations, seconds)):
+                self.index[int(g)] = number, k
+                self.seconds[int(g)] = float(t)
+
+    def __len__(self):
+
+        return len(self.index)
+
+    @property
+    def generations(self):
+        '''
+        Sorted array of the logged generations
+        '''
+
+        return np.array(sorted(self.index), dtype=int)
+
+    @property
+    def times(self):
+        '''
+        Time taken by each of the logged generations, in order
+        '''
+
+        return np.array([self.seconds[g] for g in sorted(self.index)])
+
+    def fitness(self, generation):
+
+        return self._rows(generation, 'fitness')
+
+    def rank(self, generation):
+
+        return self._rows(generation, 'rank')
+
+    def params(self, generation):
+        '''
+        Returns: the logged params of a generation, and their rows in its fitness and rank arrays
+        '''
+
+        return self._rows(generation, 'params'), self._rows(generation, 'params_rows')
+
+    def select(self, field, start=None, stop=None):
+        '''
+        Returns: a list of arrays of a field ('fitness', 'rank', 'params' or 'params_rows'), one for each
+                 logged generation from start up to but not including stop
+        '''
+
+        return [self._rows(g, field) for g in sorted(self.index)
+                if (start is None or g >= start) and (stop is None or g < stop)]
+
+    def _rows(self, generation, field):
+
+        if generation not in self.index:
+            raise KeyError('Generation %d is not in the log' % generation)
+
+        number, k = self.index[generation]
+        offsets = self._field(number, _ROW_FIELDS[field])
+        start, stop = offsets[k], offsets[k+1]
+
+        # A chunk has params only if some of its generations do
+        if field == 'params' and start == stop:
+            return None
+
+        return self._field(number, field)[start:stop]
+
+    def _field(self, number, field, cache=True):
+
+        name = os.path.join(self.path, '%06d' % number)
+
+        if not os.path.exists(name + '.npz'):
+            return np.load('%s.%s.npy' % (name, field), mmap_mode='r')
+
+        # Reading one field of a compressed chunk decompresses only that field
+        if not cache:
+            with np.load(name + '.npz') as data:
+                return data[field]
+
+        if self.cached is None or self.cached[0] != number:
+            with np.load(name + '.npz') as data:
+                self.cached = number, {key : data[key] for key in data.files}
+
+        return self.cached[1][field]
@@ -0,0 +1,160 @@
+'''
+Cheap regression models of a problem's fitness, for screening out unpromising individuals before
+they are evaluated.  Each model is trained incrementally on the (params, fitness) pairs evaluated
+so far and predicts the fitnesses of new params:
+
+    NSGA2(problem, 100, surrogate=KNNSurrogate(), screen_fraction=0.5).run(100, reporter)
+
+Copyright (C) 2020 Simon D. Levy
+
+MIT License
+'''
+
+import numpy as np
+
+# Maximum number of elements in a temporary distance block; bounds memory for large training sets
+_BLOCK_SIZE = 1 << 22
+
+def _squared_distances(Q, X):
+    '''
+    Returns the matrix of squared Euclidean distances from each row of Q to each row of X
+    '''
+
+    return np.maximum(np.sum(Q**2, axis=1)[:,np.newaxis] + np.sum(X**2, axis=1)[np.newaxis,:] - 2 * Q.dot(X.T), 0)
+
+class _Surrogate:
+    '''
+    Keeps the most recent training samples, with params scaled by their standard deviations, and
+    refits the model when asked for a prediction after new samples have come in
+    '''
+
+    def __init__(self, max_samples, min_samples):
+
+        self.max_samples = max_samples
+        self.min_samples = min_samples
+
+        self.X = None
+        self.F = None
+        self.scale = None       # standard deviations of the params, set when fitting
+        self.scalar = False     # fitnesses are scalars rather than vectors
+        self.dirty = False
+
+    def __len__(self):
+
+        return 0 if self.X is None else len(self.X)
+
+    @property
+    def ready(self):
+        '''
+        True once the model has enough samples to make predictions
+        '''
+
+        return len(self) >= self.min_samples
+
+    def update(self, X, F):
+        '''
+        Adds evaluated individuals to the training set, dropping the oldest beyond max_samples.
+        Inputs:
+            X  N x ndim matrix of params
+            F  N x fsiz matrix, or vector of N scalars, of their fitnesses
+        '''
+
+        X = np.asarray(X, dtype=float).reshape(len(X), -1)
+        F = np.asarray(F, dtype=float)
+        self.scalar = F.ndim == 1
+        F = F.reshape(len(F), -1)
+
+        self.X = X if self.X is None else np.concatenate((self.X, X))[-self.max_samples:]
+        self.F = F if self.F is None else np.concatenate((self.F, F))[-self.max_samples:]
+        self.dirty = True
+
+    def predict(self, X):
+        '''
+        Inputs:
+            X  N x ndim matrix of params
+        Returns: the predicted fitnesses, in the same form as those passed to update()
+        '''
+
+        if self.dirty:
+            self.scale = np.std(self.X, axis=0)
+            self.scale[self.scale == 0] = 1
+            self._fit(self.X / self.scale, self.F)
+            self.dirty = False
+
+        Q = np.asarray(X, dtype=float).reshape(len(X), -1) / self.scale
+
+        step = max(1, _BLOCK_SIZE // len(self.X))
+        F = np.concatenate([self._predict(Q[k:k+step]) for k in range(0, len(Q), step)])
+
+        return F[:,0] if self.scalar else F
+
+class KNNSurrogate(_Surrogate):
+    '''
+    Predicts the inverse-distance-weighted mean fitness of the k nearest training samples
+    '''
+
+    def __init__(self, k=5, max_samples=10000, min_samples=None):
+        '''
+        Inputs:
+            k            number of neighbors
+            max_samples  number of most recent samples kept for training
+            min_samples  number of samples needed before predicting; default None uses 4k
+        '''
+
+        _Surrogate.__init__(self, max_samples, 4*k if min_samples is None else min_samples)
+
+        self.k = k
+
+    def _fit(self, X, F):
+
+        self.Xs, self.Fs = X, F
+
+    def _predict(self, Q):
+
+        k = min(self.k, len(self.Xs))
+
+        D = np.sqrt(_squared_distances(Q, self.Xs))
+        nearest = np.argpartition(D, k-1, axis=1)[:,:k]
+        d = np.take_along_axis(D, nearest, axis=1)
+
+        # An exact match gets all the weight
+        w = 1 / np.maximum(d, 1e-12)
+        w /= np.sum(w, axis=1, keepdims=True)
+
+        return np.einsum('nk,nkf->nf', w, self.Fs[nearest])
+
+class RBFSurrogate(_Surrogate):
+    '''
+    Interpolates the fitnesses of the training samples with Gaussian radial basis functions, whose
+    width is the median distance between samples
+    '''
+
+    def __init__(self, max_samples=500, min_samples=20, smoothing=1e-6):
+        '''
+        Inputs:
+            max_samples  number of most recent samples used as centers; fitting takes time cubic in this
+            min_samples  number of samples needed before predicting
+            smoothing    ridge added to the kernel matrix, trading exact interpolation for stability
+        '''
+
+        _Surrogate.__init__(self, max_samples, min_samples)
+
+        self.smoothing = smoothing
+
+    def _fit(self, X, F):
+
+        D2 = _squared_distances(X, X)
+        width2 = np.median(D2[np.triu_indices(len(X), 1)]) if len(X) > 1 else 1.
+        self.width2 = width2 if width2 > 0 else 1.
+
+        self.centers = X
+        self.mean = np.mean(F, axis=0)
+        K = np.exp(-D2 / self.width2) + self.smoothing * np.eye(len(X))
+        try:
+            self.weights = np.linalg.solve(K, F - self.mean)
+        except np.linalg.LinAlgError: # repeated samples with too little smoothing
+            self.weights = np.linalg.lstsq(K, F - self.mean, rcond=None)[0]
+
+    def _predict(self, Q):
+
+        return self.mean + np.exp(-_squared_distances(Q, self.centers) / self.width2).dot(self.weights)